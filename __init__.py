@@ -1,2 +1,4 @@
 from .load import epLoad
-from . import dfplot
\ No newline at end of file
+from . import dfplot
+from . import batch
+from . import stats
@@ -0,0 +1,171 @@
+'''
+loads the same selection from many simulations (i.e. parametric runs) in parallel with a process pool.
+
+    import epresults as ep
+    df = ep.batch.getseries_many('c:/runs/*/eplusout.sql', 'Zone Air Temperature', workers=16)
+    tbl = ep.batch.get_tabular_many('c:/runs/*/eplusout.sql', {'ReportName': 'AnnualBuildingUtilityPerformanceSummary',
+                                    'ReportForString': 'Entire Facility', 'TableName': 'Site and Source Energy'})
+
+simulations can be given as a glob pattern or a list of paths/patterns, with or without the '.sql' extension.
+failures in single simulations are reported and do not abort the batch.
+'''
+
+import warnings
+import glob as gb
+import concurrent.futures
+import numpy as np
+import pandas as pd
+
+from .load import epLoad
+from .tables import TABLE_NAME_COLUMNS
+
+
+
+def sim_paths(paths):
+    '''expands a glob pattern or list of paths/patterns into simulation paths (no extension)'''
+    if isinstance(paths, str):
+        paths = [paths]
+    simpaths = []
+    for path in paths:
+        matches = sorted(gb.glob(path)) if gb.has_magic(path) else [path]
+        for match in matches:
+            simpaths.append(match[:-4] if match.endswith('.sql') else match)
+    return simpaths
+
+
+def _run(func, simpaths, args, workers):
+    '''yields (simpath, result or exception) for func(simpath, *args), in order of completion'''
+    if workers == 0:
+        for path in simpaths:
+            try:
+                yield path, func(path, *args)
+            except Exception as e:
+                yield path, e
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(func, path, *args): path for path in simpaths}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                yield futures[future], e
+
+
+def _collect(results, simpaths, what):
+    '''splits (simpath, result) pairs into ordered results and failures, warning on each failure'''
+    done, failures = {}, {}
+    for path, result in results:
+        if isinstance(result, Exception):
+            failures[path] = '{0}: {1}'.format(type(result).__name__, result)
+            warnings.warn("{0} failed for {1}: {2}".format(what, path, failures[path]))
+        else:
+            done[path] = result
+    return [(path, done[path]) for path in simpaths if path in done], failures
+
+
+def _getseries(simpath, query, cache, kwargs):
+    with epLoad(simpath, cache=cache) as sim:
+        return sim.sql.getseries(query, **kwargs)
+
+
+def _getseries_env(simpath, query, cache, kwargs):
+    '''getseries with rows indexed by (environment name, dt) (or (environment name, period) if resampled),
+    from one read, so rows of sizing periods and the run period that share a date stay apart'''
+    with epLoad(simpath, cache=cache) as sim:
+        df = sim.sql.getseries(query, **dict(kwargs, envindex=True))
+        envs = sim.sql._df_query("SELECT EnvironmentPeriodIndex, EnvironmentName FROM EnvironmentPeriods")
+        names = dict(zip(envs['EnvironmentPeriodIndex'], envs['EnvironmentName']))
+        df.index = df.index.set_levels(df.index.levels[0].map(lambda i: names.get(i, i)), level=0)
+        return df
+
+
+def iter_series_many(paths, query, workers=None, cache=False, **kwargs):
+    '''yields (simpath, df) for each simulation as it finishes; df is the exception if that simulation failed.
+    args:
+        paths: glob pattern or list of simulation paths/patterns
+        query: getseries query; use a search string (or other per-file selection), since
+            ReportDataDictionary indices differ between files
+        workers (optional): number of processes (default: cpu count, 0 runs in this process)
+        cache (optional): use the columnar sidecar cache of each simulation
+        kwargs: passed to getseries (units, dtype, ...)'''
+    simpaths = sim_paths(paths)
+    return _run(_getseries, simpaths, (query, cache, kwargs), workers)
+
+
+def getseries_many(paths, query, workers=None, cache=False, **kwargs):
+    '''returns one df of all simulations with the simulation path as the outermost column level. rows are
+    aligned on (environment name, dt), so sizing periods with dates inside the run period stay apart; resampled
+    rows on (environment name, period). failed simulations are warned about and listed in
+    df.attrs['failures'] (path: error).
+    args are the same as iter_series_many'''
+    simpaths = sim_paths(paths)
+    results, failures = _collect(_run(_getseries_env, simpaths, (query, cache, kwargs), workers), simpaths, 'getseries')
+    try:
+        df = pd.concat(dict(results), axis=1) if results else pd.DataFrame()
+    except (ValueError, pd.errors.InvalidIndexError) as e:
+        # i.e. multi-year run periods, whose dates repeat inside one environment
+        warnings.warn("getseries_many could not align the simulations, see df.attrs['results']: {0}".format(e))
+        df = pd.DataFrame()
+        df.attrs['results'] = dict(results)
+    df.attrs['failures'] = failures
+    return df
+
+
+def _get_tabular(simpath, tabledict):
+    '''the table, or None if this simulation doesn't have it'''
+    with epLoad(simpath) as sim:
+        try:
+            return sim.tables.get_tabular(tabledict)
+        except KeyError:
+            return None
+
+
+def _long_table(df):
+    '''get_tabular df -> one row per cell: RowName, ColumnName, Units, Value'''
+    values = df.drop(columns=[c for c in TABLE_NAME_COLUMNS if c in df.columns])
+    ncols = values.shape[1]
+    return pd.DataFrame({
+        'RowName': np.repeat(values.index.values, ncols),
+        'ColumnName': np.tile(values.columns.get_level_values(0).values, len(values)),
+        'Units': np.tile(values.columns.get_level_values(1).values, len(values)),
+        'Value': values.to_numpy(dtype=object).ravel(),
+        })
+
+
+def get_tabular_many(paths, tabledict, workers=None, how='stacked'):
+    '''returns the same tabular report table from many simulations as one df keyed by simulation path.
+    simulations without the table are skipped and listed in df.attrs['missing']; other failures are
+    warned about and listed in df.attrs['failures'] (path: error).
+    args:
+        paths: glob pattern or list of simulation paths/patterns
+        tabledict: ReportName, ReportForString and TableName of the table (as for get_tabular; a row of
+            avail_tabular, as a Series or a one-row df, or a find_tables handle also works)
+        workers (optional): number of processes (default: cpu count, 0 runs in this process)
+        how (optional): 'stacked': the tables one under another, rows indexed by (simulation, RowName) and
+            columns aligned by (ColumnName, Units); 'long': one row per cell with columns
+            simulation, RowName, ColumnName, Units, Value'''
+    if how not in ('stacked', 'long'):
+        raise ValueError("how must be 'stacked' or 'long'")
+    if isinstance(tabledict, pd.DataFrame):
+        if len(tabledict) != 1:
+            raise ValueError("tabledict df must have exactly one row, got {0}".format(len(tabledict)))
+        tabledict = tabledict.iloc[0]
+    tabledict = {key: tabledict[key] for key in ('ReportName', 'ReportForString', 'TableName')}
+    simpaths = sim_paths(paths)
+    results, failures = _collect(_run(_get_tabular, simpaths, (tabledict,), workers), simpaths, 'get_tabular')
+    missing = [path for path, df in results if df is None]
+    results = [(path, df) for path, df in results if df is not None]
+
+    if not results:
+        df = pd.DataFrame()
+    elif how == 'stacked':
+        df = pd.concat(dict(results), axis=0, sort=False)
+        df.index = df.index.set_names(['simulation', 'RowName'])
+    else:
+        longs = [_long_table(df) for path, df in results]
+        df = pd.concat(longs, axis=0, ignore_index=True)
+        df.insert(0, 'simulation', np.repeat([path for path, _ in results], [len(l) for l in longs]))
+    df.attrs['missing'] = missing
+    df.attrs['failures'] = failures
+    return df
@@ -0,0 +1,7 @@
+'''
+benchmark suite for epresults: a synthetic EnergyPlus output generator (generate.py)
+and a timing/memory runner for the public entry points (run.py).
+
+    python -m epresults.benchmarks --scale small --save base.json
+    python -m epresults.benchmarks --scale small --compare base.json
+'''
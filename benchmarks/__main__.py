@@ -0,0 +1,38 @@
+'''
+command line runner:
+    python -m epresults.benchmarks [--scale small] [--repeat 5] [--match getseries]
+                                   [--save base.json] [--compare base.json] [--threshold 0.1]
+exits with status 1 if --compare finds a case slower than the baseline by more than threshold,
+or failing where the baseline ran.
+'''
+
+import sys
+import argparse
+
+from . import run
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m epresults.benchmarks')
+    parser.add_argument('--scale', default='small', choices=sorted(run.SCALES))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--match', default=None, help='only run cases whose name contains this')
+    parser.add_argument('--fixtures', default=None, help='fixture directory (default: temp dir)')
+    parser.add_argument('--save', default=None, help='write results to this json file')
+    parser.add_argument('--compare', default=None, help='baseline json to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args(argv)
+
+    results = run.run(args.scale, args.repeat, args.match, args.fixtures)
+    if args.save:
+        run.save(results, args.save)
+    if args.compare:
+        df = run.compare(args.compare, results, args.threshold)
+        print(df.to_string(float_format='{0:.4f}'.format))
+        if df['regressed'].any():
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,313 @@
+'''
+writes synthetic, schema-correct EnergyPlus output files (eplusout.sql, .bnd, .eso)
+for benchmarking. values are random but repeatable for a given seed.
+'''
+
+import os
+import sqlite3
+import datetime
+import numpy as np
+
+
+# bumped when the generated files change, so stored benchmark fixtures are rewritten
+VERSION = 2
+
+
+SCHEMA = '''
+CREATE TABLE Simulations (SimulationIndex INTEGER PRIMARY KEY, EnergyPlusVersion TEXT, TimeStamp TEXT,
+    NumTimestepsPerHour INTEGER, Completed BOOL, CompletedSuccessfully BOOL);
+CREATE TABLE EnvironmentPeriods (EnvironmentPeriodIndex INTEGER PRIMARY KEY, SimulationIndex INTEGER,
+    EnvironmentName TEXT, EnvironmentType INTEGER);
+CREATE TABLE Time (TimeIndex INTEGER PRIMARY KEY, Year INTEGER, Month INTEGER, Day INTEGER, Hour INTEGER,
+    Minute INTEGER, Dst INTEGER, Interval INTEGER, IntervalType INTEGER, SimulationDays INTEGER,
+    DayType TEXT, EnvironmentPeriodIndex INTEGER, WarmupFlag INTEGER);
+CREATE TABLE ReportDataDictionary (ReportDataDictionaryIndex INTEGER PRIMARY KEY, IsMeter INTEGER,
+    Type TEXT, IndexGroup TEXT, TimestepType TEXT, KeyValue TEXT, Name TEXT, ReportingFrequency TEXT,
+    ScheduleName TEXT, Units TEXT);
+CREATE TABLE ReportData (ReportDataIndex INTEGER PRIMARY KEY, TimeIndex INTEGER,
+    ReportDataDictionaryIndex INTEGER, Value REAL);
+CREATE TABLE StringTypes (StringTypeIndex INTEGER PRIMARY KEY, Value TEXT);
+CREATE TABLE Strings (StringIndex INTEGER PRIMARY KEY, StringTypeIndex INTEGER, Value TEXT,
+    UNIQUE(StringTypeIndex, Value));
+CREATE TABLE TabularData (TabularDataIndex INTEGER PRIMARY KEY, ReportNameIndex INTEGER,
+    ReportForStringIndex INTEGER, TableNameIndex INTEGER, RowNameIndex INTEGER, ColumnNameIndex INTEGER,
+    UnitsIndex INTEGER, SimulationIndex INTEGER, RowId INTEGER, ColumnId INTEGER, Value TEXT);
+CREATE VIEW TabularDataWithStrings AS SELECT
+    td.TabularDataIndex, td.Value As Value, reportn.Value As ReportName, fs.Value As ReportForString,
+    tn.Value As TableName, rn.Value As RowName, cn.Value As ColumnName, u.Value As Units
+    FROM TabularData As td
+    INNER JOIN Strings As reportn ON reportn.StringIndex=td.ReportNameIndex
+    INNER JOIN Strings As fs ON fs.StringIndex=td.ReportForStringIndex
+    INNER JOIN Strings As tn ON tn.StringIndex=td.TableNameIndex
+    INNER JOIN Strings As rn ON rn.StringIndex=td.RowNameIndex
+    INNER JOIN Strings As cn ON cn.StringIndex=td.ColumnNameIndex
+    INNER JOIN Strings As u ON u.StringIndex=td.UnitsIndex;
+'''
+
+DAYTYPES = ['Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
+
+FREQ_INTERVALTYPE = {
+    'Zone Timestep': 0,
+    'Hourly': 1,
+    'Daily': 2,
+    'Monthly': 3,
+    'Run Period': 4,
+    }
+
+# (IndexGroup, KeyValue template, Name, Units, IsMeter, Type)
+SERIES_TEMPLATES = [
+    ('Zone', 'BLOCK{0}:ZONE{1}', 'Zone Air Temperature', 'C', 0, 'Avg'),
+    ('Zone', 'BLOCK{0}:ZONE{1}', 'Zone Mean Air Humidity Ratio', 'kgWater/kgDryAir', 0, 'Avg'),
+    ('Zone', 'BLOCK{0}:ZONE{1}', 'Zone Ideal Loads Supply Air Total Heating Energy', 'J', 0, 'Sum'),
+    ('HVAC', 'NODE {0}-{1}', 'System Node Temperature', 'C', 0, 'Avg'),
+    ('HVAC', 'NODE {0}-{1}', 'System Node Standard Density Volume Flow Rate', 'm3/s', 0, 'Avg'),
+    ('HVAC', 'NODE {0}-{1}', 'System Node Mass Flow Rate', 'kg/s', 0, 'Avg'),
+    ('HVAC', 'FAN {0}-{1}', 'Fan Electricity Rate', 'W', 0, 'Avg'),
+    ('Facility:Electricity', '', 'Electricity:Facility', 'J', 1, 'Sum'),
+    ]
+
+
+def _series_dictionary(n_series, frequency):
+    '''returns list of ReportDataDictionary tuples (without index)'''
+    rows = []
+    meters = set()
+    n = 0
+    while len(rows) < n_series:
+        for group, key, name, units, ismeter, stype in SERIES_TEMPLATES:
+            if len(rows) >= n_series:
+                break
+            if ismeter:
+                if name in meters:
+                    continue
+                meters.add(name)
+            keyvalue = key.format(n // 10 + 1, n % 10 + 1)
+            timestep = 'HVAC System' if group == 'HVAC' else 'Zone'
+            rows.append((ismeter, stype, group, timestep, keyvalue, name, frequency, '', units))
+        n += 1
+    return rows
+
+
+def _time_rows(timesteps, days, design_days):
+    '''returns list of Time tuples (without index) plus environment list'''
+    rows = []
+    environments = []
+    interval = 60 // timesteps
+    freq_type = 0 if timesteps > 1 else 1
+    start = datetime.date(2013, 1, 1)
+
+    periods = []
+    for num in range(design_days):
+        month = 1 if num % 2 == 0 else 7
+        periods.append(('DESIGN DAY {0}'.format(num + 1), 1, [datetime.date(2013, month, 21)],
+                        'WinterDesignDay' if month == 1 else 'SummerDesignDay'))
+    periods.append(('RUN PERIOD 1', 3, [start + datetime.timedelta(days=d) for d in range(days)], None))
+
+    for envnum, (envname, envtype, dates, daytype) in enumerate(periods):
+        envidx = envnum + 1
+        environments.append((envidx, 1, envname, envtype))
+        for simday, date in enumerate(dates):
+            dtype = daytype or DAYTYPES[(date.weekday() + 1) % 7]
+            for hour in range(24):
+                for step in range(timesteps):
+                    minute = (step + 1) * interval
+                    rhour = hour
+                    if minute == 60:
+                        rhour, minute = hour + 1, 0
+                    rows.append((date.year, date.month, date.day, rhour, minute, 0, interval, freq_type,
+                                 simday + 1, dtype, envidx, 0))
+            rows.append((date.year, date.month, date.day, 24, 0, 0, 1440, 2, simday + 1, dtype, envidx, 0))
+            nextday = date + datetime.timedelta(days=1)
+            if nextday.month != date.month or simday == len(dates) - 1:
+                rows.append((date.year, date.month, date.day, 24, 0, 0, date.day * 1440, 3, simday + 1,
+                             dtype, envidx, 0))
+        # like EnergyPlus, run period rows have no Month/Day/Hour/Minute
+        rows.append((dates[-1].year, None, None, None, None, 0, len(dates) * 1440, 4,
+                     len(dates), dtype, envidx, 0))
+    return rows, environments
+
+
+def _tabular_rows(n_tables, rows_per_table, cols_per_table, rng):
+    '''returns (strings, tabulardata) tuples'''
+    strings = {}
+
+    def stridx(stype, value):
+        key = (stype, value)
+        if key not in strings:
+            strings[key] = len(strings) + 1
+        return strings[key]
+
+    reports = ['AnnualBuildingUtilityPerformanceSummary', 'SystemSummary', 'EquipmentSummary',
+               'HVACSizingSummary', 'EnvelopeSummary']
+    data = []
+    for t in range(n_tables):
+        report = reports[t % len(reports)]
+        rep = stridx(1, report)
+        repfor = stridx(2, 'Entire Facility')
+        if t == 0:
+            table = stridx(3, 'Site and Source Energy')
+        else:
+            table = stridx(3, 'Table {0}'.format(t))
+        for r in range(rows_per_table):
+            row = stridx(4, 'BLOCK{0}:ZONE{1}'.format(r // 10 + 1, r % 10 + 1))
+            for c in range(cols_per_table):
+                col = stridx(5, 'Column {0}'.format(c + 1))
+                units = stridx(6, ['GJ', 'W', 'C', ''][c % 4])
+                if c % 4 == 3:
+                    value = ['Yes', 'No', 'Coil:Cooling:DX'][r % 3]
+                else:
+                    value = '{0:14.2f}'.format(rng.uniform(0, 1000))
+                data.append((rep, repfor, table, row, col, units, 1, r, c, value))
+    strlist = [(idx, stype, value) for (stype, value), idx in strings.items()]
+    return strlist, data
+
+
+def write_sql(fname, n_series=50, timesteps=1, days=365, design_days=2, n_tables=20,
+              rows_per_table=10, cols_per_table=6, seed=0):
+    '''writes a synthetic eplusout.sql; returns path'''
+    rng = np.random.default_rng(seed)
+    if os.path.exists(fname):
+        os.remove(fname)
+    conn = sqlite3.connect(fname)
+    conn.executescript(SCHEMA)
+    conn.execute("INSERT INTO Simulations VALUES (1, 'Version 9.0.1', '2013.01.01 00:00', ?, 1, 1)", (timesteps,))
+    conn.executemany("INSERT INTO StringTypes VALUES (?, ?)", [
+        (1, 'ReportName'), (2, 'ReportForString'), (3, 'TableName'),
+        (4, 'RowName'), (5, 'ColumnName'), (6, 'Units')])
+
+    timerows, environments = _time_rows(timesteps, days, design_days)
+    conn.executemany("INSERT INTO EnvironmentPeriods VALUES (?, ?, ?, ?)", environments)
+    conn.executemany("INSERT INTO Time (Year, Month, Day, Hour, Minute, Dst, Interval, IntervalType, "
+                     "SimulationDays, DayType, EnvironmentPeriodIndex, WarmupFlag) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", timerows)
+
+    frequency = 'Zone Timestep' if timesteps > 1 else 'Hourly'
+    dictrows = _series_dictionary(n_series, frequency)
+    dictrows += [(1, 'Sum', 'Facility:Electricity', 'Zone', '', 'Electricity:Facility', freq, '', 'J')
+                 for freq in ('Daily', 'Monthly', 'Run Period')]
+    conn.executemany("INSERT INTO ReportDataDictionary (IsMeter, Type, IndexGroup, TimestepType, KeyValue, "
+                     "Name, ReportingFrequency, ScheduleName, Units) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", dictrows)
+
+    times = np.array([(num + 1, row[7]) for num, row in enumerate(timerows)])
+    for num, row in enumerate(dictrows):
+        rddi = num + 1
+        tidx = times[times[:, 1] == FREQ_INTERVALTYPE[row[6]], 0]
+        values = rng.normal(20, 5, len(tidx))
+        conn.executemany("INSERT INTO ReportData (TimeIndex, ReportDataDictionaryIndex, Value) VALUES (?, ?, ?)",
+                         zip(tidx.tolist(), [rddi] * len(tidx), values.tolist()))
+
+    strings, tabular = _tabular_rows(n_tables, rows_per_table, cols_per_table, rng)
+    conn.executemany("INSERT INTO Strings VALUES (?, ?, ?)", strings)
+    conn.executemany("INSERT INTO TabularData (ReportNameIndex, ReportForStringIndex, TableNameIndex, "
+                     "RowNameIndex, ColumnNameIndex, UnitsIndex, SimulationIndex, RowId, ColumnId, Value) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", tabular)
+    conn.commit()
+    conn.close()
+    return fname
+
+
+def write_bnd(fname, n_series=50):
+    '''writes a synthetic eplusout.bnd with node fluid types for the generated node series'''
+    lines = ['Program Version,EnergyPlus, Version 9.0.1',
+             '! <Node>,<NodeNumber>,<Node Name>,<Node Fluid Type>,<# Times Node Referenced After Definition>']
+    seen = set()
+    for row in _series_dictionary(n_series, 'Hourly'):
+        keyvalue = row[4]
+        if keyvalue.startswith('NODE') and keyvalue not in seen:
+            seen.add(keyvalue)
+            fluid = 'Water' if len(seen) % 3 == 0 else 'Air'
+            lines.append(' Node,{0},{1},{2},2'.format(len(seen), keyvalue, fluid))
+    with open(fname, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return fname
+
+
+def write_eso(fname, n_series=50, timesteps=1, days=365, design_days=2, seed=0):
+    '''writes a synthetic eplusout.eso; returns path'''
+    rng = np.random.default_rng(seed)
+    interval = 60 // timesteps
+    freq = 'TimeStep' if timesteps > 1 else 'Hourly'
+    lines = [
+        'Program Version,EnergyPlus, Version 9.0.1-bb7ca4f0da, YMD=2013.01.01 00:00',
+        '1,5,Environment Title[],Latitude[deg],Longitude[deg],Time Zone[],Elevation[m]',
+        '2,8,Day of Simulation[],Month[],Day of Month[],DST Indicator[1=yes 0=no],Hour[],StartMinute[],EndMinute[],DayType',
+        '3,5,Cumulative Day of Simulation[],Month[],Day of Month[],DST Indicator[1=yes 0=no],DayType  ! When Daily Report Variables Requested',
+        '4,2,Cumulative Days of Simulation[],Month[]  ! When Monthly Report Variables Requested',
+        '5,1,Cumulative Days of Simulation[] ! When Run Period Report Variables Requested',
+        '6,1,Calendar Year of Simulation[] ! When Annual Report Variables Requested',
+        ]
+    dictrows = _series_dictionary(n_series, freq)
+    hourly = []
+    for num, row in enumerate(dictrows):
+        idx = num + 7
+        hourly.append(idx)
+        if row[4]:
+            lines.append('{0},1,{1},{2} [{3}] !{4}'.format(idx, row[4], row[5], row[8], freq))
+        else:
+            lines.append('{0},1,{1} [{2}] !{3}'.format(idx, row[5], row[8], freq))
+    daily = len(dictrows) + 7
+    monthly = daily + 1
+    runperiod = daily + 2
+    lines.append('{0},7,Electricity:Facility [J] !Daily  [Value,Min,Hour,Minute,Max,Hour,Minute]'.format(daily))
+    lines.append('{0},9,Electricity:Facility [J] !Monthly  [Value,Min,Day,Hour,Minute,Max,Day,Hour,Minute]'.format(monthly))
+    lines.append('{0},11,Electricity:Facility [J] !RunPeriod  [Value,Min,Month,Day,Hour,Minute,Max,Month,Day,Hour,Minute]'.format(runperiod))
+    lines.append('End of Data Dictionary')
+
+    periods = []
+    for num in range(design_days):
+        month = 1 if num % 2 == 0 else 7
+        periods.append(('DESIGN DAY {0}'.format(num + 1), [datetime.date(2013, month, 21)],
+                        'WinterDesignDay' if month == 1 else 'SummerDesignDay'))
+    start = datetime.date(2013, 1, 1)
+    periods.append(('RUN PERIOD 1', [start + datetime.timedelta(days=d) for d in range(days)], None))
+
+    def fmt(v):
+        return '{0:.6g}'.format(v)
+
+    def minmax(values):
+        return fmt(values.sum()), fmt(values.min()), fmt(values.max())
+
+    for envname, dates, daytype in periods:
+        lines.append('1,{0},  41.98, -87.92,  -6.00, 201.00'.format(envname))
+        monthvals = []
+        allvals = []
+        for simday, date in enumerate(dates):
+            dtype = daytype or DAYTYPES[(date.weekday() + 1) % 7]
+            dayvals = rng.uniform(0, 100, 24)
+            for hour in range(24):
+                for step in range(timesteps):
+                    lines.append('2,{0},{1:2d},{2:2d}, 0,{3:2d},{4:5.2f},{5:5.2f},{6}'.format(
+                        simday + 1, date.month, date.day, hour + 1, float(step * interval),
+                        float((step + 1) * interval), dtype))
+                    values = rng.normal(20, 5, len(hourly))
+                    lines.extend('{0},{1}'.format(idx, fmt(v)) for idx, v in zip(hourly, values))
+            total, lo, hi = minmax(dayvals)
+            lines.append('3,{0},{1:2d},{2:2d}, 0,{3}'.format(simday + 1, date.month, date.day, dtype))
+            lines.append('{0},{1},{2}, 3, 0,{3},15,60'.format(daily, total, lo, hi))
+            monthvals.append(dayvals)
+            allvals.append(dayvals)
+            nextday = date + datetime.timedelta(days=1)
+            if nextday.month != date.month or simday == len(dates) - 1:
+                total, lo, hi = minmax(np.concatenate(monthvals))
+                lines.append('4,{0},{1:2d}'.format(simday + 1, date.month))
+                lines.append('{0},{1},{2}, 1, 3, 0,{3},{4}, 15,60'.format(monthly, total, lo, hi, date.day))
+                monthvals = []
+        total, lo, hi = minmax(np.concatenate(allvals))
+        lines.append('5,{0}'.format(len(dates)))
+        lines.append('{0},{1},{2}, 1, 1, 3, 0,{3}, 7,21, 15,60'.format(runperiod, total, lo, hi))
+    lines.append('End of Data')
+    lines.append(' Number of Records Written=         {0}'.format(len(lines)))
+    with open(fname, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return fname
+
+
+def write_fixtures(dirname, name='eplusout', **kwargs):
+    '''writes .sql, .bnd and .eso into dirname; returns base path (no extension)'''
+    os.makedirs(dirname, exist_ok=True)
+    base = os.path.join(dirname, name)
+    sqlkeys = ['n_series', 'timesteps', 'days', 'design_days', 'n_tables', 'rows_per_table', 'cols_per_table', 'seed']
+    esokeys = ['n_series', 'timesteps', 'days', 'design_days', 'seed']
+    write_sql(base + '.sql', **{k: v for k, v in kwargs.items() if k in sqlkeys})
+    write_bnd(base + '.bnd', n_series=kwargs.get('n_series', 50))
+    write_eso(base + '.eso', **{k: v for k, v in kwargs.items() if k in esokeys})
+    return base
@@ -0,0 +1,231 @@
+'''
+times the public entry points against generated fixtures and compares runs with stored json baselines.
+
+every case is timed `repeat` times after one warm-up call (min, median and mean seconds), then run once
+more under tracemalloc for its python memory high-water mark.
+'''
+
+import os
+import gc
+import sys
+import json
+import time
+import platform
+import datetime
+import tempfile
+import warnings
+import subprocess
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+from . import generate
+from ..load import epLoad
+from ..eso import ReadEso, get_avail_series
+
+
+# fixture parameters per scale, passed to generate.write_fixtures
+SCALES = {
+    'tiny': dict(n_series=10, timesteps=1, days=31, design_days=2, n_tables=10),
+    'small': dict(n_series=50, timesteps=1, days=365, design_days=2, n_tables=20),
+    'timestep': dict(n_series=50, timesteps=4, days=365, design_days=2, n_tables=20),
+    'large': dict(n_series=500, timesteps=1, days=365, design_days=2, n_tables=200, rows_per_table=30),
+    }
+
+
+
+# helper functions
+def fixtures(scale='small', dirname=None):
+    '''base path (no extension) of the fixtures for scale, generated if missing or made with other parameters'''
+    params = dict(SCALES[scale] if isinstance(scale, str) else scale)
+    name = scale if isinstance(scale, str) else 'custom'
+    dirname = dirname or os.path.join(tempfile.gettempdir(), 'epresults-benchmarks', name)
+    base = os.path.join(dirname, 'eplusout')
+    paramfile = os.path.join(dirname, 'params.json')
+    try:
+        with open(paramfile, 'r') as f:
+            current = json.load(f) == dict(params, version=generate.VERSION)
+    except (OSError, ValueError):
+        current = False
+    if not current or not all(os.path.isfile(base + ext) for ext in ('.sql', '.bnd', '.eso')):
+        generate.write_fixtures(dirname, **params)
+        with open(paramfile, 'w') as f:
+            json.dump(dict(params, version=generate.VERSION), f)
+    return base
+
+
+def _context(base):
+    '''shared inputs of the cases, built once per run'''
+    sim = epLoad(base)
+    avail = sim.sql.availseries(None)
+    hourly = avail[avail.ReportingFrequency.isin(['Hourly', 'Zone Timestep'])]
+    temps = hourly[hourly.Name == 'Zone Air Temperature']
+    tables = sim.tables.avail_tabular()
+    eso = ReadEso(base + '.eso')
+    plotdf = sim.sql.getseries(hourly.ReportDataDictionaryIndex[:3].tolist())
+    plotdf.columns = [' '.join(map(str, col)) for col in plotdf.columns]
+    return {
+        'base': base,
+        'sim': sim,
+        'one': temps.ReportDataDictionaryIndex[:1].tolist(),
+        'hourly': hourly.ReportDataDictionaryIndex.tolist(),
+        'si': sim.sql.getseries(hourly.ReportDataDictionaryIndex.tolist(), units='si'),
+        'table': tables.iloc[0].to_dict(),
+        'eso': eso,
+        'esoidx': eso.reports.rpt_idx.iloc[0],
+        'esoidxs': eso.reports.rpt_idx.tolist(),
+        'esoindexed': ReadEso(base + '.eso', index=True),
+        'plotdf': plotdf,
+        }
+
+
+def _plot_cases():
+    '''dfplot builders (plot=False, asFigure=True); empty if plotly is not installed'''
+    try:
+        from .. import dfplot
+    except ImportError:
+        return []
+    return [
+        ('dfplot.line', lambda c: dfplot.line(c['plotdf'], plot=False, asFigure=True)),
+        ('dfplot.heatmap', lambda c: dfplot.heatmap(c['plotdf'], 0, plot=False, asFigure=True)),
+        ('dfplot.surface', lambda c: dfplot.surface(c['plotdf'], 0, plot=False, asFigure=True)),
+        ('dfplot.line_dailyrange', lambda c: dfplot.line_dailyrange(c['plotdf'], 0, plot=False, asFigure=True)),
+        ('dfplot.hist', lambda c: dfplot.hist(c['plotdf'], 0, plot=False, asFigure=True)),
+        ('dfplot.scatter', lambda c: dfplot.scatter(c['plotdf'], 0, 1, 2, plot=False, asFigure=True)),
+        ]
+
+
+def _open(base):
+    '''loads a simulation and runs one query, so the lazily opened sql connection is part of the time'''
+    with epLoad(base) as sim:
+        sim.sql.availseries(None)
+
+
+def cases():
+    '''list of (name, function of the context)'''
+    return [
+        ('epLoad', lambda c: _open(c['base'])),
+        ('sql.getseries.one', lambda c: c['sim'].sql.getseries(c['one'])),
+        ('sql.getseries.all', lambda c: c['sim'].sql.getseries(c['hourly'])),
+        ('sql.getseries.all.si', lambda c: c['sim'].sql.getseries(c['hourly'], units='si')),
+        ('sql.getseries.search', lambda c: c['sim'].sql.getseries('Zone Air Temperature', units='si')),
+        ('sql.getseries.daily_mean', lambda c: c['sim'].sql.getseries(c['hourly'], resample='D')),
+        ('sql.getseries.monthly_meters', lambda c: c['sim'].sql.getseries({'meter': 1}, resample='M', agg='sum')),
+        ('sql._conv_units', lambda c: c['sim'].sql._conv_units(c['si'])),
+        ('sql.availseries', lambda c: c['sim'].sql.availseries(None)),
+        ('tables.avail_tabular', lambda c: c['sim'].tables.avail_tabular()),
+        ('tables.get_tabular', lambda c: c['sim'].tables.get_tabular(c['table'])),
+        ('eso.get_avail_series', lambda c: get_avail_series(c['base'] + '.eso')),
+        ('eso.get_report', lambda c: c['eso'].get_report(c['esoidx'])),
+        ('eso.get_reports.all', lambda c: c['eso'].get_reports(c['esoidxs'])),
+        ('eso.get_report.indexed', lambda c: c['esoindexed'].get_report(c['esoidx'])),
+        ] + _plot_cases()
+
+
+def _time(func, ctx, repeat):
+    func(ctx)
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func(ctx)
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func(ctx)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'min': min(times), 'median': float(np.median(times)), 'mean': float(np.mean(times)),
+            'repeat': repeat, 'peak_bytes': peak}
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+
+## public functions
+def run(scale='small', repeat=5, match=None, dirname=None, verbose=True):
+    '''runs the benchmark cases and returns a results dict (meta, results) that save/compare accept.
+    args:
+        scale: key of SCALES or a dict of generate.write_fixtures parameters
+        repeat (optional): timed calls per case
+        match (optional): only run cases whose name contains this string
+        dirname (optional): fixture directory (default: a per-scale temp directory, reused between runs)
+        verbose (optional): print each result as it finishes'''
+    base = fixtures(scale, dirname)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        ctx = _context(base)
+        results = {}
+        for name, func in cases():
+            if match and match not in name:
+                continue
+            try:
+                results[name] = _time(func, ctx, repeat)
+            except Exception as e:
+                results[name] = {'error': '{0}: {1}'.format(type(e).__name__, (str(e).splitlines() or [''])[0])}
+            if verbose and 'error' in results[name]:
+                print('{0:30s} failed: {1}'.format(name, results[name]['error']))
+            elif verbose:
+                print('{0:30s} {1:10.4f} s  {2:10.1f} MiB'.format(
+                    name, results[name]['min'], results[name]['peak_bytes'] / 2**20))
+        ctx['sim'].close()
+    meta = {
+        'scale': scale,
+        'commit': _commit(),
+        'python': sys.version.split()[0],
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        }
+    return {'meta': meta, 'results': results}
+
+
+def save(results, fname):
+    '''writes run() results to a json baseline'''
+    with open(fname, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def load(fname):
+    with open(fname, 'r') as f:
+        return json.load(f)
+
+
+def compare(baseline, current, threshold=0.1):
+    '''df of min times and peak memory of current vs baseline (run() results or json paths), with
+    'regressed' set where current is slower than baseline by more than threshold (a fraction), or fails
+    where the baseline ran. failed cases keep their error in the 'error' column (current run first);
+    cases missing from the baseline are left out'''
+    if isinstance(baseline, str):
+        baseline = load(baseline)
+    if isinstance(current, str):
+        current = load(current)
+    rows = []
+    for name, cur in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        basefailed, curfailed = 'error' in base, 'error' in cur
+        rows.append({
+            'case': name,
+            'baseline_s': np.nan if basefailed else base['min'],
+            'current_s': np.nan if curfailed else cur['min'],
+            'ratio': np.nan if basefailed or curfailed or not base['min'] else cur['min'] / base['min'],
+            'baseline_mib': np.nan if basefailed else base['peak_bytes'] / 2**20,
+            'current_mib': np.nan if curfailed else cur['peak_bytes'] / 2**20,
+            'error': cur['error'] if curfailed else base.get('error'),
+            'regressed': curfailed and not basefailed,
+            })
+    columns = ['case', 'baseline_s', 'current_s', 'ratio', 'baseline_mib', 'current_mib', 'error', 'regressed']
+    df = pd.DataFrame(rows, columns=columns).set_index('case')
+    df['regressed'] = df['regressed'].astype(bool) | (df['ratio'] > 1 + threshold)
+    return df
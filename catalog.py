@@ -0,0 +1,154 @@
+'''
+in-memory catalog of the ReportDataDictionary (every reporting frequency and meter) with indexes for fast search.
+
+queries are whitespace-separated terms that must all match (case-insensitive):
+    BLOCK5                      substring of any text field
+    Zone Air Temperature        consecutive unqualified words are one phrase: a substring of one field
+    key:BLOCK5*                 field-qualified; trailing * is a prefix match of the whole value
+    name:"Zone Air Temperature" quoted: exact field value
+    units:/^(C|F)$/             /.../: regular expression
+    freq:hourly meter:1
+
+fields: key (KeyValue), name (Name), units (Units), freq (ReportingFrequency), group (IndexGroup),
+type (Type), schedule (ScheduleName) and meter (IsMeter). unqualified terms search every field but meter.
+'''
+
+import re
+import bisect
+import fnmatch
+import numpy as np
+import pandas as pd
+
+
+
+RDD_COLUMNS = [
+    'ReportDataDictionaryIndex',
+    'IsMeter',
+    'Type',
+    'IndexGroup',
+    'TimestepType',
+    'KeyValue',
+    'Name',
+    'ReportingFrequency',
+    'ScheduleName',
+    'Units',
+    ]
+
+FIELDS = {
+    'key': 'KeyValue',
+    'name': 'Name',
+    'units': 'Units',
+    'freq': 'ReportingFrequency',
+    'group': 'IndexGroup',
+    'type': 'Type',
+    'schedule': 'ScheduleName',
+    'meter': 'IsMeter',
+    }
+
+TERM_RE = re.compile(r'(?:([A-Za-z]+):)?("[^"]*"|/(?:[^/\\]|\\.)*/|\S+)')
+
+
+
+class _FieldIndex:
+    '''indexes of one catalog column: unique values (hash and sorted) and value -> rows'''
+    def __init__(self, values):
+        codes, uniques = pd.factorize(pd.Series(values).fillna('').astype(str).str.upper())
+        self.uniques = np.asarray(uniques, dtype=str)
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(self.uniques) + 1))
+        self.rows = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.uniques))]
+        self.lookup = {v: i for i, v in enumerate(self.uniques)}
+        self.sorted = sorted(self.lookup)
+
+    def _prefix(self, keys, prefix):
+        lo = bisect.bisect_left(keys, prefix)
+        hi = bisect.bisect_left(keys, prefix + '\uffff')
+        return lo, hi
+
+    def match(self, pattern):
+        '''positions into uniques matching one pattern'''
+        if len(pattern) > 1 and pattern[0] == '/' and pattern[-1] == '/':
+            regex = re.compile(pattern[1:-1], re.IGNORECASE)
+            return [i for i, v in enumerate(self.uniques) if regex.search(v)]
+        pattern = pattern.upper()
+        if pattern.startswith('"') and pattern.endswith('"') and len(pattern) > 1:
+            i = self.lookup.get(pattern[1:-1])
+            return [] if i is None else [i]
+        if any(c in pattern for c in '*?['):
+            stem = pattern[:-1]
+            if pattern.endswith('*') and not any(c in stem for c in '*?['):
+                lo, hi = self._prefix(self.sorted, stem)
+                return sorted(self.lookup[v] for v in self.sorted[lo:hi])
+            return [i for i, v in enumerate(self.uniques) if fnmatch.fnmatchcase(v, pattern)]
+        if not len(self.uniques):
+            return []
+        return np.flatnonzero(np.char.find(self.uniques, pattern) >= 0).tolist()
+
+    def rows_for(self, positions):
+        if not positions:
+            return np.empty(0, dtype='int64')
+        return np.concatenate([self.rows[i] for i in positions])
+
+
+
+class SeriesCatalog:
+    '''searchable catalog of series, built once from a ReportDataDictionary df (see SqlSeries.catalog).
+    args:
+        dictionary: df with ReportDataDictionary columns'''
+    def __init__(self, dictionary):
+        self.frame = dictionary.reset_index(drop=True)
+        self.fields = {alias: _FieldIndex(self.frame[col].values) for alias, col in FIELDS.items()
+                       if col in self.frame.columns}
+        self._cache = {}
+        self._terms = {}
+
+
+    # helper functions
+    def _parse(self, query):
+        '''list of (field alias or None, pattern); each run of unqualified words is one phrase'''
+        terms = []
+        phrase = None
+        for match in TERM_RE.finditer(query):
+            field, pattern = match.groups()
+            if field and field.lower() in FIELDS:
+                if phrase is not None:
+                    terms.append((None, query[phrase[0]:phrase[1]]))
+                    phrase = None
+                terms.append((field.lower(), pattern))
+            else:
+                phrase = (match.start() if phrase is None else phrase[0], match.end())
+        if phrase is not None:
+            terms.append((None, query[phrase[0]:phrase[1]]))
+        return terms
+
+    def _term_rows(self, field, pattern):
+        if (field, pattern) in self._terms:
+            return self._terms[(field, pattern)]
+        aliases = [field] if field else [f for f in self.fields if f != 'meter']
+        rows = [self.fields[f].rows_for(self.fields[f].match(pattern)) for f in aliases if f in self.fields]
+        rows = np.unique(np.concatenate(rows)) if rows else np.empty(0, dtype='int64')
+        if len(self._terms) > 4096:
+            self._terms.clear()
+        self._terms[(field, pattern)] = rows
+        return rows
+
+
+    # public functions
+    def positions(self, query):
+        '''sorted row positions into self.frame matching every term of query'''
+        if query in self._cache:
+            return self._cache[query]
+        result = None
+        for field, pattern in self._parse(query):
+            rows = self._term_rows(field, pattern)
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+        if result is None:
+            result = np.arange(len(self.frame))
+        if len(self._cache) > 4096:
+            self._cache.clear()
+        self._cache[query] = result
+        return result
+
+    def search(self, query):
+        '''ReportDataDictionary rows matching query as a df'''
+        return self.frame.iloc[self.positions(query)]
@@ -54,6 +54,27 @@ def colname_to_int(df, colname):
         num = colname
         name = df.iloc[:,colname].name
     return num, name
+
+
+def _colorbar(title):
+    '''colorbar with its title on the right ('titleside' was replaced by title.side in plotly 3.5)'''
+    if lv(plotly.__version__) >= lv('3.5'):
+        return {'title': {'text': title, 'side': 'right'}}
+    return {'title': title, 'titleside': 'right'}
+
+
+def _title(text, size):
+    '''title and font size arguments of a layout or axis ('titlefont' was replaced by title.font in plotly 4)'''
+    if lv(plotly.__version__) >= lv('4.0'):
+        return {'title': {'text': text, 'font': {'size': size}}}
+    return {'title': text, 'titlefont': {'size': size}}
+
+
+def _week(index):
+    '''iso week of a DatetimeIndex (DatetimeIndex.week was removed in pandas 2)'''
+    if hasattr(index, 'isocalendar'):
+        return index.isocalendar().week.values.astype('int64')
+    return index.week
         
 
 def scatter(df,
@@ -77,7 +98,7 @@ def scatter(df,
         marker = dict(color = df.iloc[:,z].values,
                         colorscale=colorscale,
                         showscale=True,
-                        colorbar={'title': marker_title, 'titleside': 'right'})
+                        colorbar=_colorbar(marker_title))
               
         trace = go.Scatter(
             x = df.iloc[:,x].values,
@@ -142,7 +163,7 @@ def heatmap(df,
     dfpivot = pd.DataFrame(df.iloc[:,x])
     dfpivot['hour'] = dfpivot.index.hour
     dfpivot['day'] = dfpivot.index.map(lambda x: x.strftime('%b-%d'))
-    dfpivot['week'] = dfpivot.index.week    
+    dfpivot['week'] = _week(dfpivot.index)
     dfpivot['month'] = dfpivot.index.month
     dfpivot['dayofyear'] = dfpivot.index.dayofyear
     dfpivot.columns = [''.join(x) for x in dfpivot.columns]
@@ -216,7 +237,7 @@ def surface(df,
     dfpivot = pd.DataFrame(df.iloc[:,x])
     dfpivot['hour'] = dfpivot.index.hour
     dfpivot['day'] = dfpivot.index.map(lambda x: x.strftime('%b-%d'))
-    dfpivot['week'] = dfpivot.index.week    
+    dfpivot['week'] = _week(dfpivot.index)
     dfpivot['month'] = dfpivot.index.month
     dfpivot['dayofyear'] = dfpivot.index.dayofyear
     dfpivot.columns = [''.join(x) for x in dfpivot.columns]
@@ -258,7 +279,10 @@ def surface(df,
     if layoutupdate:
         layout.update(layoutupdate)
         
-    fig['data'][0]['colorbar'].update({'titleside':'right'})
+    if lv(plotly.__version__) >= lv('3.5'):
+        fig['data'][0]['colorbar']['title'].update({'side':'right'})
+    else:
+        fig['data'][0]['colorbar'].update({'titleside':'right'})
     if plot:
         py.iplot(fig,config=config)
     if asFigure:
@@ -271,7 +295,7 @@ def line(df,
          plot=True, asFigure=False, layoutupdate=False, autosize = True): 
             
     '''simple plot for a dataframe. plots all columns.'''
-    if type(df.columns) == pd.core.index.MultiIndex:
+    if type(df.columns) == pd.MultiIndex:
         df.columns = [', '.join(col) for col in df.columns]
     if type(df) == pd.core.series.Series:
         df = pd.DataFrame(df)
@@ -288,11 +312,10 @@ def line(df,
         layout = go.Layout(paper_bgcolor='rgba(0,0,0,0)',
                            plot_bgcolor = 'rgba(0,0,0,0)',
                            font=dict(family='Futura LT BT, monospace', size = 14),
-                           title=plot_title,
                            height=height,
-                           titlefont= dict(size=24),
-                           xaxis = dict(title= xaxistitle, titlefont= dict(size = 18)),
-                           yaxis = dict(title=yaxistitle, titlefont=dict(size =18)),
+                           xaxis = dict(_title(xaxistitle, 18)),
+                           yaxis = dict(_title(yaxistitle, 18)),
+                           **_title(plot_title, 24),
                            #legend = dict(orientation='h', xanchor='right', x=1.02, yanchor='top', y=0))
                            legend = dict(x=1.02))
     else:
@@ -301,10 +324,9 @@ def line(df,
                            paper_bgcolor='rgba(0,0,0,0)',
                            plot_bgcolor = 'rgba(0,0,0,0)',
                            font=dict(family='Futura LT BT, monospace', size = 14),
-                           title=plot_title,
-                           titlefont= dict(size=24),
-                           xaxis = dict(title= xaxistitle, titlefont= dict(size = 18)),
-                           yaxis = dict(title=yaxistitle, titlefont=dict(size =18)),
+                           xaxis = dict(_title(xaxistitle, 18)),
+                           yaxis = dict(_title(yaxistitle, 18)),
+                           **_title(plot_title, 24),
                            #legend = dict(orientation='h', xanchor='right', x=1.02, yanchor='top', y=0)),
                            legend = dict(x=1.02))
     if layoutupdate:
@@ -1,9 +1,46 @@
 import sys
 import os
+import re
+import time
 import glob as gb
 import sqlite3
+from array import array
+import numpy as np
 import pandas as pd
 
+from .stats import stage, call
+from .esoindex import EsoIndex, report_widths
+
+
+# data line fields of each reporting frequency
+REPORT_FIELDS = {
+    'TimeStep': ['Value'],
+    'Hourly': ['Value'],
+    'Daily': ['Value','Min','MinHour','MinMinute','Max','MaxHour','MaxMinute'],
+    'Monthly': ['Value','Min','MinDay','MinHour','MinMinute','Max','MaxDay','MaxHour','MaxMinute'],
+    'RunPeriod': ['Value','Min','MinMonth','MinDay','MinHour','MinMinute','Max','MaxMonth','MaxDay','MaxHour','MaxMinute'],
+    'Annual': ['Value','Min','MinMonth','MinDay','MinHour','MinMinute','Max','MaxMonth','MaxDay','MaxHour','MaxMinute'],
+    }
+
+# fields holding report values; the others are the (integer) time of the min and max
+VALUE_FIELDS = ['Value', 'Min', 'Max']
+
+# environment (1) and time stamp (2-6) record codes, and their fields after the code
+STAMP_CODES = (1, 2, 3, 4, 5, 6)
+STAMP_FIELDS = {
+    1: ['Environment', 'Latitude', 'Longitude', 'TimeZone', 'Elevation'],
+    2: ['DayOfSimulation', 'Month', 'Day', 'DST', 'Hour', 'StartMinute', 'EndMinute', 'DayType'],
+    3: ['DayOfSimulation', 'Month', 'Day', 'DST', 'DayType'],
+    4: ['DayOfSimulation', 'Month'],
+    5: ['DayOfSimulation'],
+    6: ['Year'],
+    }
+
+TIME_COLUMNS = ['Code', 'EnvironmentIndex', 'Environment', 'DayOfSimulation', 'Month', 'Day', 'Hour',
+                'StartMinute', 'EndMinute', 'DayType', 'dt']
+
+UNITS_RE = re.compile(r'^(.*?)\s*\[(.*)\]\s*$')
+
 
 
 
@@ -44,9 +81,23 @@ def parse_header(header):
     return [name_clean, period, keyvalue, name, p_type, idx]#, right]
 
 
+def read_data_dict(file):
+    '''data dictionary lines of an eso file, read without loading the data part of the file'''
+    data_dict = []
+    with open(file, 'r') as f:
+        for line in f:
+            if "End of Data Dictionary" in line:
+                break
+            data_dict.append(line)
+    return data_dict
+
+
 def get_avail_series(file):
-    flist = open_eso(file)
-    data_dict = get_data_dict(flist)
+    return avail_series(read_data_dict(file))
+
+
+def avail_series(data_dict):
+    '''ReadEso.reports of a list of data dictionary lines'''
     dflist = []
     for d in data_dict[7:]:
         series = parse_header(d)
@@ -66,15 +117,8 @@ def get_series(idx, flist, data_dict_df):
     
 def array_to_df(array):
     info, data = array
-    coldict = { 
-        'Hourly': ['Value'],
-        'Daily': ['Value','Min','Hour','Minute','Max','Hour','Minute'],
-        'Monthly': ['Value','Min','Day','Hour','Minute','Max','Day','Hour','Minute'],
-        'RunPeriod': ['Value','Min','Month','Day','Hour','Minute','Max','Month','Day','Hour','Minute'],
-        }
-    
     period = info.rpt_period.tolist()[0]
-    dfcolumns = coldict[period]
+    dfcolumns = REPORT_FIELDS[period]
     df = pd.DataFrame(data)
     df.columns = dfcolumns
     return info, df
@@ -92,21 +136,389 @@ def multi_index_df(info, df):
     return df
 
 
+def stamp_frame(stamps, env=0, title=None, envstart=None):
+    '''time df (TIME_COLUMNS) of the environment and time stamp records [(code, fields)], in file order.
+    dt is the start of each interval in year 1900, as in SqlSeries: timestep rows start at Hour-1:StartMinute,
+    daily rows at their day, monthly rows at the first of the month and run period/annual rows at the
+    first day of their environment.
+    to build the frame piecewise, pass the EnvironmentIndex and Environment of the last earlier record as
+    env and title, and the same envstart dict ({EnvironmentIndex: first dt}, updated in place) each time'''
+    rows = []
+    envstart = {} if envstart is None else envstart
+    for code, fields in stamps:
+        if code == 1:
+            env += 1
+            title = fields[0].strip() if fields else None
+        row = dict(zip(STAMP_FIELDS[code], (x.strip() for x in fields)))
+        row['Code'] = code
+        row['EnvironmentIndex'] = env
+        row['Environment'] = title
+        rows.append(row)
+    df = pd.DataFrame(rows, columns=TIME_COLUMNS[:-1])
+    for col in ['DayOfSimulation', 'Month', 'Day', 'Hour', 'StartMinute', 'EndMinute']:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    code = df['Code'].values.astype(int)
+    month = df['Month'].fillna(1).values.astype(int)
+    day = np.where(code == 4, 1, df['Day'].fillna(1).values.astype(int))
+    minutes = np.where(code == 2, (df['Hour'].fillna(1).values - 1) * 60 + df['StartMinute'].fillna(0).values, 0)
+    dates = pd.to_datetime(pd.DataFrame({'year': 1900, 'month': month, 'day': day}))
+    dt = pd.Series(dates.values + pd.to_timedelta(minutes, unit='m').values, index=df.index)
+    days = np.isin(code, (2, 3))
+    for key, start in dt[days].groupby(df['EnvironmentIndex'][days]).min().items():
+        envstart[key] = min(envstart.get(key, start), start)
+    longer = np.isin(code, (5, 6))
+    if longer.any():
+        dt[longer] = df['EnvironmentIndex'][longer].map(envstart).fillna(dt[longer]).values
+    dt[code == 1] = pd.NaT
+    df['dt'] = dt
+    return df
+
+
+def report_times(time, rows, period):
+    '''interval start of each data line of a report, from its rows in the stamp_frame.
+    hourly lines follow the stamp of the last timestep of their hour, so they are moved to the full hour'''
+    dt = time['dt'].values[rows]
+    if period == 'Hourly':
+        dt = dt - pd.to_timedelta(time['StartMinute'].fillna(0).values[rows], unit='m').values
+    return pd.DatetimeIndex(dt, name='dt')
+
+
+def _name_units(keyvalue, name):
+    '''(KeyValue, Name, Units) of a report as SqlSeries names them; meters have no key value'''
+    if not name.strip():
+        keyvalue, name = '', keyvalue
+    match = UNITS_RE.match(name)
+    name, units = (match.group(1), match.group(2)) if match else (name.strip(), '')
+    return keyvalue.strip(), name.strip(), units.strip()
+
+
+def report_frame(info, values, dt, dtype='float64'):
+    '''typed df of one report: Value/Min/Max as dtype, the min/max time fields as int64, indexed by dt.
+    columns are the (IndexGroup, TimestepType, KeyValue, Name, Units) levels of SqlSeries.getseries
+    (IndexGroup and TimestepType are not in eso files and left empty); fields other than Value are
+    named '<Name> <field>', i.e. 'Zone Air Temperature Max' and 'Zone Air Temperature MaxHour'
+    args:
+        info: the report's row of ReadEso.reports (as a df)
+        values: 2d array, one row per data line
+        dt: DatetimeIndex of the rows (see report_times)'''
+    row = info.iloc[0]
+    keyvalue, name, units = _name_units(row['keyvalue'], row['name'])
+    data = {}
+    columns = []
+    for i, field in enumerate(REPORT_FIELDS[row['rpt_period']]):
+        if field in VALUE_FIELDS:
+            data[i] = values[:, i].astype(dtype)
+            columns.append(('', '', keyvalue, name if field == 'Value' else name + ' ' + field, units))
+        else:
+            data[i] = values[:, i].astype('int64')
+            columns.append(('', '', keyvalue, name + ' ' + field, ''))
+    df = pd.DataFrame(data, index=dt)
+    df.columns = pd.MultiIndex.from_tuples(columns, names=[None] * 5)
+    return df
+
+
+
+
+
+
 
+_STAMP_IDS = set(str(c) for c in STAMP_CODES)
 
 
+class EsoStream:
+    '''incremental eso parser: feed it lines in file order (feed / feed_line) and it keeps the data dictionary
+    and, for the requested report indices, every data line in growable float arrays, so any number of reports
+    come out of one pass with memory bounded by the reports asked for.
+    args:
+        idxs (optional): report indices (int or str) to keep; None keeps every report'''
+    def __init__(self, idxs=None):
+        self.wanted = None if idxs is None else set(str(i) for i in idxs)
+        self.data_dict = []
+        self.in_dictionary = True
+        self.widths = {}
+        self.values = {}
+        self.rows = {}
+        self.stamps = []
+        self.lines = 0
+
+    def _end_dictionary(self):
+        self.in_dictionary = False
+        for idx, width in report_widths(self.data_dict).items():
+            if self.wanted is None or idx in self.wanted:
+                self.widths[idx] = width
+                self.values[idx] = array('d')
+                self.rows[idx] = array('q')
+
+    def feed_line(self, line):
+        self.feed([line])
+
+    def feed(self, lines):
+        '''parses a list of lines'''
+        values = self.values
+        widths = self.widths
+        rows = self.rows
+        stamps = self.stamps
+        codes = _STAMP_IDS
+        for line in lines:
+            self.lines += 1
+            if self.in_dictionary:
+                if "End of Data Dictionary" in line:
+                    self._end_dictionary()
+                else:
+                    self.data_dict.append(line)
+                continue
+            idx, sep, rest = line.partition(',')
+            if idx in values:
+                fields = rest.split(',')
+                if len(fields) != widths[idx]:
+                    raise ValueError("eso line {0}: report {1} has {2} values, expected {3}".format(
+                        self.lines, idx, len(fields), widths[idx]))
+                values[idx].extend(map(float, fields))
+                rows[idx].append(len(stamps) - 1)
+            elif idx in codes:
+                stamps.append((int(idx), rest.rstrip('\r\n').split(',')))
+
+    def report(self, idx):
+        '''2d float array (one row per data line) of a kept report'''
+        idx = str(idx)
+        return np.frombuffer(self.values[idx], dtype='float64').reshape(-1, self.widths[idx]).copy()
+
+    def report_rows(self, idx):
+        '''row in time() of the time stamp of each data line of a kept report'''
+        return np.frombuffer(self.rows[str(idx)], dtype='int64').copy()
+
+    def time(self):
+        '''stamp_frame of the environment and time stamp records read so far'''
+        return stamp_frame(self.stamps)
+
+
+def stream_reports(file, idxs=None, blocksize=2**20):
+    '''reads file once in blocks of about blocksize bytes and returns the EsoStream holding
+    the data of every report in idxs (None: all reports)'''
+    stream = EsoStream(idxs)
+    with open(file, 'r') as f:
+        while True:
+            lines = f.readlines(blocksize)
+            if not lines:
+                break
+            stream.feed(lines)
+    return stream
+
+
+
+class EsoTail:
+    '''follows an eso file that is still being written (i.e. by a running simulation).
+    each poll() reads only the bytes appended since the last one and parses the complete time stamp blocks
+    among them; the last block, which may still be growing, is held back until the next stamp (or the
+    end of data) arrives. new rows are appended to the per-report arrays of an EsoStream.
+    the file is read from the start again if it shrinks (a new run).
+    args:
+        file: eso file path
+        idxs (optional): report indices to keep (default: all)
+        callback (optional): called with the {idx: df} of new rows after every poll that finds some
+        dtype (optional): dtype of the report values, as in ReadEso.get_report
+        stats (optional): stats.Stats that records per-stage timings of each poll'''
+    def __init__(self, file, idxs=None, callback=None, dtype='float64', stats=None):
+        self.file = file
+        self.idxs = idxs
+        self.callback = callback
+        self.dtype = dtype
+        self.stats = stats
+        self.reset()
+
+
+    # helper functions
+    def _split(self, lines):
+        '''(lines to parse now, lines to hold back): data lines are released up to the last stamp line'''
+        stream = self.stream
+        if stream.in_dictionary:
+            for i, line in enumerate(lines):
+                if "End of Data Dictionary" in line:
+                    stream.feed(lines[:i + 1])
+                    self.reports = avail_series(stream.data_dict)
+                    return self._split(lines[i + 1:])
+            return lines, []
+        for line in lines:
+            if line.startswith('End of Data'):
+                self.complete = True
+                return lines, []
+        for i in range(len(lines) - 1, -1, -1):
+            if lines[i].partition(',')[0] in _STAMP_IDS:
+                return lines[:i], lines[i:]
+        return [], lines
+
+    def _append_time(self):
+        '''stamp_frame of the stamps parsed by the last feed; returns the position of its first row'''
+        first = self._timed
+        new = self.stream.stamps[first:]
+        if new:
+            env, title = (0, None) if not self._times else (
+                self._times[-1]['EnvironmentIndex'].iloc[-1], self._times[-1]['Environment'].iloc[-1])
+            frame = stamp_frame(new, env, title, self._envstart)
+            frame.index = pd.RangeIndex(first, first + len(frame))
+            self._times.append(frame)
+            self._timed += len(new)
+        return first
+
+    def _dt(self, rows, period):
+        '''report_times of stamp rows, looked up in the newest time frame when they are all in it'''
+        frame = self._times[-1] if self._times else None
+        if frame is None or not len(rows) or rows.min() < frame.index[0]:
+            return report_times(self.time(), rows, period)
+        return report_times(frame, rows - frame.index[0], period)
+
+
+    ## public functions
+    def reset(self):
+        '''forgets everything read; the next poll starts at the beginning of the file'''
+        self.stream = EsoStream(self.idxs)
+        self.offset = 0
+        self.complete = False
+        self.reports = None
+        self._partial = b''
+        self._held = []
+        self._counts = {}
+        self._times = []
+        self._timed = 0
+        self._envstart = {}
+
+    def poll(self):
+        '''parses what was appended to the file since the last poll and returns the new rows as
+        {idx: df} (the layout of ReadEso.get_report), leaving out reports without new rows'''
+        new = {}
+        with call(self.stats, 'poll', file=self.file) as total:
+            with stage(self.stats, 'read') as rec:
+                size = os.path.getsize(self.file)
+                if size < self.offset:
+                    self.reset()
+                with open(self.file, 'rb') as f:
+                    f.seek(self.offset)
+                    data = f.read(size - self.offset)
+                self.offset += len(data)
+                rec['bytes'] = len(data)
+            if not data:
+                return new
+            with stage(self.stats, 'parse') as rec:
+                data = self._partial + data
+                cut = data.rfind(b'\n') + 1
+                self._partial = data[cut:]
+                lines = data[:cut].decode().replace('\r\n', '\n').splitlines(True)
+                ready, self._held = self._split(self._held + lines)
+                self.stream.feed(ready)
+                rec['rows'] = len(ready)
+            if self.reports is None:
+                return new
+            with stage(self.stats, 'frame'):
+                self._append_time()
+                for idx, values in self.stream.values.items():
+                    width = self.stream.widths[idx]
+                    before = self._counts.get(idx, 0)
+                    count = len(values) // width
+                    if count == before:
+                        continue
+                    self._counts[idx] = count
+                    info = self.reports[self.reports.rpt_idx == idx]
+                    rows = np.frombuffer(self.stream.rows[idx], dtype='int64')[before:count]
+                    block = np.frombuffer(values, dtype='float64')[before * width:count * width].reshape(-1, width)
+                    new[idx] = report_frame(info, block, self._dt(rows, info.rpt_period.iloc[0]), self.dtype)
+            total['rows'] = sum(len(df) for df in new.values())
+        if new and self.callback is not None:
+            self.callback(new)
+        return new
+
+    def follow(self, interval=5.0, timeout=None):
+        '''generator of the non-empty poll() results, polling every interval seconds until the end of
+        data has been read or, if timeout is given, no data arrived for timeout seconds'''
+        last = time.monotonic()
+        while True:
+            new = self.poll()
+            if new:
+                last = time.monotonic()
+                yield new
+            if self.complete:
+                return
+            if timeout is not None and time.monotonic() - last > timeout:
+                return
+            time.sleep(interval)
+
+    def time(self):
+        '''stamp_frame of every time stamp parsed so far'''
+        if not self._times:
+            return stamp_frame([])
+        if len(self._times) > 1:
+            self._times = [pd.concat(self._times)]
+        return self._times[0]
+
+    def get_report(self, idx):
+        '''every row of one report parsed so far, as ReadEso.get_report returns it'''
+        idx = str(idx)
+        info = self.reports[self.reports.rpt_idx == idx] if self.reports is not None else []
+        if not len(info) or idx not in self.stream.values:
+            raise KeyError("no report {0} read from {1}".format(idx, self.file))
+        dt = report_times(self.time(), self.stream.report_rows(idx), info.rpt_period.iloc[0])
+        return report_frame(info, self.stream.report(idx), dt, self.dtype)
+
 
 
 class ReadEso:
-    def __init__(self, file):
-        self.reports = get_avail_series(file)
+    '''reads reports from an EnergyPlus eso file.
+    args:
+        file: eso file path
+        stats (optional): stats.Stats that records per-stage timings of each get_report call
+        index (optional): keep a byte-offset index of the file (see esoindex.EsoIndex), built on the first
+            get_report and reused, also by later ReadEso objects, until the file changes. reports are then read
+            from their own lines only instead of a scan of the whole file'''
+    def __init__(self, file, stats=None, index=False):
+        self.stats = stats
+        self.index = EsoIndex(file) if index else None
+        self._time = None
+        with call(stats, 'get_avail_series', file=file) as total:
+            self.reports = get_avail_series(file)
+            total['rows'] = len(self.reports)
         self.file = file
     
-    def get_report(self, idx):
-        flist = open_eso(self.file)
-        data_dict_df = self.reports
-        array = get_series(idx, flist, data_dict_df)
-        info, df = array_to_df(array)
-        df = multi_index_df(info, df)
-        return df
+    # helper functions
+    def _index_time(self):
+        '''stamp_frame of the indexed file, parsed once per index build'''
+        key = self.index._key
+        if self._time is None or self._time[0] is not key:
+            self._time = (key, stamp_frame(self.index.stamp_lines()))
+        return self._time[1]
+
+
+    ## public functions
+    def get_reports(self, idxs, dtype='float64'):
+        '''returns {idx: df} for every report index in idxs, all read in one pass over the file
+        (or from the index, if there is one). each df has the same layout as get_report'''
+        with call(self.stats, 'get_reports', file=self.file) as total:
+            if self.index is not None:
+                with stage(self.stats, 'index'):
+                    self.index.ensure()
+            with stage(self.stats, 'read') as rec:
+                if self.index is not None:
+                    arrays = {str(idx): (self.index.read(idx), self.index.stamp_rows(idx)) for idx in idxs}
+                    times = self._index_time()
+                    rec['rows'] = sum(len(a[0]) for a in arrays.values())
+                else:
+                    stream = stream_reports(self.file, idxs)
+                    arrays = {i: (stream.report(i), stream.report_rows(i)) for i in stream.values}
+                    times = stream.time()
+                    rec['rows'], rec['bytes'] = stream.lines, os.path.getsize(self.file)
+            with stage(self.stats, 'frame'):
+                dfs = {}
+                for idx in idxs:
+                    info = self.reports[self.reports.rpt_idx == str(idx)]
+                    if str(idx) not in arrays or not len(info):
+                        raise KeyError("no report {0} in {1}".format(idx, self.file))
+                    values, rows = arrays[str(idx)]
+                    dt = report_times(times, rows, info.rpt_period.iloc[0])
+                    dfs[idx] = report_frame(info, values, dt, dtype)
+            total['rows'] = sum(len(df) for df in dfs.values())
+        return dfs
+
+    def get_report(self, idx, dtype='float64'):
+        '''df of one report, indexed by the start of each interval (year 1900), with the columns of
+        SqlSeries.getseries(..., units='si') (see report_frame). dtype can be 'float32' to halve memory'''
+        return self.get_reports([idx], dtype)[idx]
         
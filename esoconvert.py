@@ -0,0 +1,211 @@
+'''
+converts an EnergyPlus eso file to a columnar directory of numpy arrays that later reads memory-map.
+the data part of the file is split into chunks at time stamp lines and the chunks are parsed in a
+process pool, so conversion of large files scales with the number of cores.
+
+    python -m epresults.esoconvert eplusout.eso [outdir] [--workers 8] [--chunksize 64]
+
+layout of the output directory (default <simname>.esocolumns next to the eso file):
+    <idx>.npy       values of report idx, one row per data line (float64, the report's width of columns)
+    <idx>.time.npy  row in time.pkl of the time stamp each data line belongs to
+    time.pkl        every environment (1) and time stamp (2-6) line, with a 'dt' column (year 1900,
+                    start of the interval; run period and annual rows: start of their environment)
+    reports.pkl     ReadEso.reports of the file
+    dictionary.txt  data dictionary lines
+    key.json        size, mtime and sampled hash of the eso file
+'''
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import warnings
+import concurrent.futures
+import numpy as np
+import pandas as pd
+
+from .seriescache import file_key
+from .esoindex import report_widths, _line_ids
+from .eso import (read_data_dict, get_avail_series, stamp_frame, report_times, report_frame,
+                  STAMP_CODES)
+
+
+# helper functions
+def _data_start(file):
+    '''byte offset of the first line after 'End of Data Dictionary' '''
+    with open(file, 'rb') as f:
+        for line in f:
+            if b"End of Data Dictionary" in line:
+                return f.tell()
+    raise ValueError("no 'End of Data Dictionary' in {0}".format(file))
+
+
+def _stamp_code(line):
+    code = line.split(b',', 1)[0].strip()
+    return int(code) if code.isdigit() and int(code) in STAMP_CODES else None
+
+
+def _chunks(file, chunksize):
+    '''[(start, end)] byte ranges of the data part of file, each starting at a time stamp line'''
+    start = _data_start(file)
+    size = os.path.getsize(file)
+    bounds = [start]
+    with open(file, 'rb') as f:
+        pos = start + chunksize
+        while pos < size:
+            f.seek(pos)
+            f.readline()
+            while True:
+                at = f.tell()
+                line = f.readline()
+                if not line:
+                    at = size
+                    break
+                if _stamp_code(line) is not None:
+                    break
+            if at >= size:
+                break
+            bounds.append(at)
+            pos = at + chunksize
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def _lookup(keys, values, ids):
+    '''values at the positions of ids in keys'''
+    order = np.argsort(keys)
+    return values[order][np.searchsorted(keys[order], ids)]
+
+
+def _parse_chunk(file, start, end, widths):
+    '''parses one byte range: (stamp lines as (code, fields), {idx: (values, local stamp row)})'''
+    with open(file, 'rb') as f:
+        f.seek(start)
+        buf = f.read(end - start)
+    starts, ends, ids = _line_ids(buf, 0)
+
+    isstamp = np.isin(ids, STAMP_CODES)
+    stamps = []
+    for s, e, code in zip(starts[isstamp].tolist(), ends[isstamp].tolist(), ids[isstamp].tolist()):
+        stamps.append((code, buf[s:e].decode().split(',')[1:]))
+    stamprow = np.cumsum(isstamp) - 1
+
+    known = np.array([int(i) for i in widths], dtype='int64')
+    isdata = np.isin(ids, known)
+    width = _lookup(known, np.array(list(widths.values()), dtype='int64'), ids[isdata])
+
+    lines = [buf[s:e].partition(b',')[2] for s, e in zip(starts[isdata].tolist(), ends[isdata].tolist())]
+    text = b','.join(lines)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        values = np.fromstring(text, dtype='float64', sep=',') if lines else np.empty(0)
+    if len(values) != width.sum():
+        raise ValueError("eso bytes {0}-{1}: {2} values, expected {3} from the data dictionary".format(
+            start, end, len(values), width.sum()))
+
+    first = np.concatenate([[0], np.cumsum(width)[:-1]]).astype('int64')
+    dataids = ids[isdata]
+    datarows = stamprow[isdata]
+    reports = {}
+    for idx in np.unique(dataids).tolist():
+        mine = dataids == idx
+        w = widths[str(idx)]
+        cells = first[mine][:, None] + np.arange(w)
+        reports[idx] = (values[cells], datarows[mine])
+    return stamps, reports
+
+
+## public functions
+def convert_eso(file, outdir=None, workers=None, chunksize=2**26):
+    '''converts an eso file to a columnar directory (see module docstring) and returns its path.
+    args:
+        file: eso file path
+        outdir (optional): output directory, defaults to <simname>.esocolumns next to the eso file
+        workers (optional): parser processes (default: os.cpu_count()); 1 parses in this process
+        chunksize (optional): approximate bytes per parsed chunk'''
+    outdir = outdir or os.path.splitext(file)[0] + '.esocolumns'
+    key = file_key(file)
+    data_dict = read_data_dict(file)
+    widths = report_widths(data_dict)
+    chunks = _chunks(file, int(chunksize))
+    workers = workers or os.cpu_count() or 1
+
+    stamps = []
+    parts = {}
+    def collect(result):
+        chunkstamps, reports = result
+        for idx, (values, rows) in reports.items():
+            parts.setdefault(idx, []).append((values, rows + len(stamps)))
+        stamps.extend(chunkstamps)
+
+    if workers == 1 or len(chunks) == 1:
+        for start, end in chunks:
+            collect(_parse_chunk(file, start, end, widths))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            futures = [pool.submit(_parse_chunk, file, start, end, widths) for start, end in chunks]
+            for future in futures:
+                collect(future.result())
+
+    tmpdir = '{0}.tmp-{1}'.format(outdir, os.getpid())
+    if os.path.exists(tmpdir):
+        shutil.rmtree(tmpdir)
+    os.makedirs(tmpdir)
+    for idx in sorted(parts):
+        chunkparts = parts[idx]
+        np.save(os.path.join(tmpdir, '{0}.npy'.format(idx)), np.concatenate([p[0] for p in chunkparts]))
+        np.save(os.path.join(tmpdir, '{0}.time.npy'.format(idx)), np.concatenate([p[1] for p in chunkparts]))
+        parts[idx] = None
+    stamp_frame(stamps).to_pickle(os.path.join(tmpdir, 'time.pkl'))
+    get_avail_series(file).to_pickle(os.path.join(tmpdir, 'reports.pkl'))
+    with open(os.path.join(tmpdir, 'dictionary.txt'), 'w') as f:
+        f.writelines(line.rstrip('\r\n') + '\n' for line in data_dict)
+    with open(os.path.join(tmpdir, 'key.json'), 'w') as f:
+        json.dump(key, f)
+
+    if os.path.exists(outdir):
+        shutil.rmtree(outdir)
+    os.replace(tmpdir, outdir)
+    return outdir
+
+
+
+class EsoColumns:
+    '''reads the output of convert_eso; report arrays are memory-mapped.
+    args:
+        outdir: directory written by convert_eso'''
+    def __init__(self, outdir):
+        self.outdir = outdir
+        self.reports = pd.read_pickle(os.path.join(outdir, 'reports.pkl'))
+        self.time = pd.read_pickle(os.path.join(outdir, 'time.pkl'))
+
+    def values(self, idx):
+        '''(values, time rows) memmaps of one report'''
+        fname = os.path.join(self.outdir, '{0}.npy'.format(idx))
+        if not os.path.isfile(fname):
+            raise KeyError("no report {0} in {1}".format(idx, self.outdir))
+        return np.load(fname, mmap_mode='r'), np.load(os.path.join(self.outdir, '{0}.time.npy'.format(idx)), mmap_mode='r')
+
+    def get_report(self, idx, dtype='float64'):
+        '''df of one report, as ReadEso.get_report returns it'''
+        values, rows = self.values(idx)
+        info = self.reports[self.reports.rpt_idx == str(idx)]
+        dt = report_times(self.time, np.asarray(rows), info.rpt_period.iloc[0])
+        return report_frame(info, np.asarray(values), dt, dtype)
+
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m epresults.esoconvert')
+    parser.add_argument('file', help='eso file')
+    parser.add_argument('outdir', nargs='?', default=None, help='output directory (default: <simname>.esocolumns)')
+    parser.add_argument('--workers', type=int, default=None, help='parser processes (default: all cores)')
+    parser.add_argument('--chunksize', type=float, default=64, help='MiB per parsed chunk')
+    args = parser.parse_args(argv)
+    print(convert_eso(args.file, args.outdir, args.workers, int(args.chunksize * 2**20)))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,231 @@
+'''
+persistent byte-offset index of an EnergyPlus eso file, stored next to the eso file, so a report's
+lines can be read straight from a memory map instead of scanning the whole file for them.
+
+layout of the index directory:
+    dictionary.txt  data dictionary lines (up to 'End of Data Dictionary')
+    reports.npy     sorted report index of every report that has data lines
+    offsets.npy     start of each report in starts/ends (len(reports) + 1)
+    starts.npy      byte offset of each data line, grouped by report, in file order
+    ends.npy        byte offset of the end of each data line (before the newline)
+    stamps.npy      (byte offset, code) of every environment (1) and time stamp (2-6) line
+    key.json        size, mtime and sampled hash of the eso file the index was built from
+'''
+
+import os
+import json
+import mmap
+import shutil
+import numpy as np
+
+from .seriescache import file_key
+
+
+
+def report_widths(data_dict):
+    '''{report index (str): values per data line} from the 'idx,nvalues,...' dictionary lines'''
+    widths = {}
+    for line in data_dict[1:]:
+        fields = line.split(',', 2)
+        if len(fields) < 2 or not fields[1].strip().isdigit():
+            continue
+        idx = fields[0].strip()
+        if idx.isdigit() and int(idx) > 6:
+            widths[idx] = int(fields[1])
+    return widths
+
+
+def _line_ids(buf, offset):
+    '''(line starts, line ends, leading integer of each line or -1) of a block of whole lines'''
+    data = np.frombuffer(buf, dtype='uint8')
+    ends = np.flatnonzero(data == 10)
+    if not len(ends) or ends[-1] != len(data) - 1:
+        ends = np.append(ends, len(data))
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    commas = np.flatnonzero(data == 44)
+    pos = np.searchsorted(commas, starts)
+    first = np.append(commas, len(data))[pos]
+    width = np.where(first < ends, first - starts, 0)
+    ids = np.zeros(len(starts), dtype='int64')
+    valid = width > 0
+    for w in range(int(width.max()) if len(width) else 0):
+        cols = w < width
+        digit = data[np.minimum(starts + w, len(data) - 1)].astype('int64') - 48
+        valid &= ~cols | ((digit >= 0) & (digit <= 9))
+        ids = np.where(cols, ids * 10 + digit, ids)
+    ids[~valid] = -1
+    ends = np.where((ends > starts) & (data[np.maximum(ends - 1, 0)] == 13), ends - 1, ends)
+    return starts + offset, ends + offset, ids
+
+
+
+class EsoIndex:
+    '''sidecar line index of one eso file; built on first use and rebuilt whenever the eso file changes.
+    args:
+        esofile: eso file path
+        indexdir (optional): index directory, defaults to <simname>.esoindex next to the eso file'''
+    def __init__(self, esofile, indexdir=None):
+        self.esofile = esofile
+        self.indexdir = indexdir or os.path.splitext(esofile)[0] + '.esoindex'
+        self._key = None
+        self._arrays = None
+        self._mm = None
+        self._file = None
+        self._stamp_lines = None
+
+
+    # helper functions
+    def _path(self, name):
+        return os.path.join(self.indexdir, name)
+
+    def _stat_matches(self):
+        st = os.stat(self.esofile)
+        return self._key is not None and (st.st_size, st.st_mtime_ns) == (self._key['size'], self._key['mtime_ns'])
+
+    def _load(self):
+        self.close()
+        self._arrays = {name: np.load(self._path(name + '.npy'), mmap_mode='r')
+                        for name in ('reports', 'offsets', 'starts', 'ends', 'stamps')}
+        with open(self._path('dictionary.txt'), 'r') as f:
+            self.data_dict = f.read().splitlines(True)
+        self.widths = report_widths(self.data_dict)
+        self._stamp_lines = None
+
+    def _stored_key(self):
+        try:
+            with open(self._path('key.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _map(self):
+        if self._mm is None:
+            self._file = open(self.esofile, 'rb')
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mm
+
+
+    # public functions
+    def valid(self):
+        '''True if the index on disk was built from the current eso file'''
+        stored = self._stored_key()
+        return stored is not None and stored == file_key(self.esofile)
+
+    def ensure(self):
+        '''loads the index, building it first if it is missing or stale'''
+        if self._arrays is not None and self._stat_matches():
+            return
+        key = file_key(self.esofile)
+        if self._stored_key() != key:
+            self.build(key)
+        self._key = key
+        self._load()
+
+    def build(self, key=None, blocksize=2**24):
+        '''scans the eso file once, in blocks of whole lines, and writes the index atomically'''
+        key = key or file_key(self.esofile)
+        data_dict = []
+        starts, ends, ids = [], [], []
+        with open(self.esofile, 'rb') as f:
+            for line in f:
+                if b"End of Data Dictionary" in line:
+                    break
+                data_dict.append(line.decode().rstrip('\r\n') + '\n')
+            offset = f.tell()
+            while True:
+                block = f.read(blocksize)
+                if not block:
+                    break
+                if not block.endswith(b'\n'):
+                    block += f.readline()
+                s, e, i = _line_ids(block, offset)
+                starts.append(s)
+                ends.append(e)
+                ids.append(i)
+                offset += len(block)
+        starts = np.concatenate(starts) if starts else np.empty(0, dtype='int64')
+        ends = np.concatenate(ends) if ends else np.empty(0, dtype='int64')
+        ids = np.concatenate(ids) if ids else np.empty(0, dtype='int64')
+
+        stamp = (ids >= 1) & (ids <= 6)
+        stamps = np.column_stack([starts[stamp], ids[stamp]]).astype('int64')
+        data = ids > 6
+        order = np.argsort(ids[data], kind='stable')
+        reports, counts = np.unique(ids[data], return_counts=True)
+
+        tmpdir = '{0}.tmp-{1}'.format(self.indexdir, os.getpid())
+        if os.path.exists(tmpdir):
+            shutil.rmtree(tmpdir)
+        os.makedirs(tmpdir)
+        np.save(os.path.join(tmpdir, 'reports.npy'), reports)
+        np.save(os.path.join(tmpdir, 'offsets.npy'), np.concatenate([[0], np.cumsum(counts)]).astype('int64'))
+        np.save(os.path.join(tmpdir, 'starts.npy'), starts[data][order])
+        np.save(os.path.join(tmpdir, 'ends.npy'), ends[data][order])
+        np.save(os.path.join(tmpdir, 'stamps.npy'), stamps.reshape(-1, 2))
+        with open(os.path.join(tmpdir, 'dictionary.txt'), 'w') as f:
+            f.writelines(data_dict)
+        with open(os.path.join(tmpdir, 'key.json'), 'w') as f:
+            json.dump(key, f)
+
+        self._arrays = None
+        self.close()
+        if os.path.exists(self.indexdir):
+            shutil.rmtree(self.indexdir)
+        os.replace(tmpdir, self.indexdir)
+
+    def clear(self):
+        '''removes the index directory'''
+        self._arrays = None
+        self._key = None
+        self.close()
+        if os.path.exists(self.indexdir):
+            shutil.rmtree(self.indexdir)
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._file.close()
+            self._mm = None
+            self._file = None
+
+    def stamps(self):
+        '''(byte offset, code) array of the environment and time stamp lines'''
+        return self._arrays['stamps']
+
+    def stamp_lines(self):
+        '''[(code, fields)] of the environment and time stamp lines, read once from the file'''
+        if self._stamp_lines is None:
+            mm = self._map()
+            stamps = self.stamps()
+            ends = [mm.find(b'\n', s) for s in stamps[:, 0].tolist()]
+            self._stamp_lines = [(code, mm[s:e].decode().rstrip('\r').split(',')[1:])
+                                 for (s, code), e in zip(stamps.tolist(), ends)]
+        return self._stamp_lines
+
+    def stamp_rows(self, idx):
+        '''position in stamps() of the time stamp each data line of a report belongs to'''
+        starts = self.lines(idx)[0]
+        return np.searchsorted(self.stamps()[:, 0], starts, side='right') - 1
+
+    def lines(self, idx):
+        '''(starts, ends) byte offsets of the data lines of one report; empty if it has none'''
+        reports = self._arrays['reports']
+        pos = np.searchsorted(reports, int(idx))
+        if pos >= len(reports) or reports[pos] != int(idx):
+            return self._arrays['starts'][:0], self._arrays['ends'][:0]
+        start, end = self._arrays['offsets'][pos], self._arrays['offsets'][pos + 1]
+        return self._arrays['starts'][start:end], self._arrays['ends'][start:end]
+
+    def read(self, idx):
+        '''2d float array (one row per data line) of one report, parsed from its indexed lines only'''
+        width = self.widths.get(str(idx))
+        if width is None:
+            raise KeyError("no report {0} in {1}".format(idx, self.esofile))
+        mm = self._map()
+        starts, ends = self.lines(idx)
+        fields = b','.join([mm[s:e].partition(b',')[2] for s, e in zip(starts.tolist(), ends.tolist())]).split(b',')
+        if len(starts) and len(fields) != len(starts) * width:
+            raise ValueError("eso report {0} has {1} values in {2} lines, expected {3} per line".format(
+                idx, len(fields), len(starts), width))
+        values = np.array(fields if len(starts) else [], dtype='S').astype('float64')
+        return values.reshape(-1, width)
@@ -1,10 +1,36 @@
 from . import timeseries
 from . import tables
+from .session import SqlSession
 
 class epLoad():
-    def __init__(self, fname):
-        self.sql = timeseries.SqlSeries(fname)
-        self.tables = tables.SqlTables(fname)
+    '''loads an EnergyPlus sql file; time series are under .sql and tabular reports under .tables.
+    both share one read-only session, which can be closed explicitly or by using epLoad as a context manager:
+
+        with epLoad(pathtosim) as mysim:
+            df = mysim.sql.getseries(...)
+
+    cache=True keeps a columnar copy of the time series next to the sql file for fast repeat reads (see SqlSeries).
+    stats takes a stats.Stats that records per-stage timings of the .sql and .tables calls.
+    '''
+    def __init__(self, fname, cache=False, stats=None):
+        self.session = SqlSession(fname)
+        self.stats = stats
+        self.sql = timeseries.SqlSeries(fname, session=self.session, cache=cache, stats=stats)
+        self.tables = tables.SqlTables(fname, session=self.session, stats=stats)
+
+    def prepare(self, inplace=False):
+        '''indexes a sidecar copy of the sql file (or, with inplace=True, the file itself) for fast lookups;
+        see SqlSession.prepare'''
+        return self.session.prepare(inplace)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
 
 
-    
\ No newline at end of file
@@ -0,0 +1,52 @@
+'''
+structured series selection, compiled to a parameterized sql where clause on ReportDataDictionary
+so only matching rows ever leave sqlite.
+
+    Selector(key=('glob', 'BLOCK5*'), name='Zone Air Temperature', freq='Hourly')
+    Selector(Name=['Zone Air Temperature', 'Zone Air Relative Humidity'], IsMeter=0)
+    Selector(units=('like', '%/s'))
+
+predicates are keyword args on ReportDataDictionary columns (or the catalog aliases key, name, units,
+freq, group, type, schedule, meter). a value is an equality test, a list/tuple of values an IN test and
+('like', pattern) / ('glob', pattern) the sqlite LIKE / GLOB operators. all predicates must match.
+getseries also accepts a plain dict of the same predicates.
+'''
+
+from .catalog import FIELDS, RDD_COLUMNS
+
+
+OPERATORS = {'like': 'LIKE', 'glob': 'GLOB'}
+
+
+
+class Selector:
+    '''series selection; see module docstring for the predicate forms'''
+    def __init__(self, **predicates):
+        self.predicates = []
+        for field, value in predicates.items():
+            column = FIELDS.get(field, field)
+            if column not in RDD_COLUMNS:
+                raise ValueError("unknown ReportDataDictionary field '{0}'".format(field))
+            self.predicates.append((column, value))
+
+    def __repr__(self):
+        return 'Selector({0})'.format(', '.join('{0}={1!r}'.format(c, v) for c, v in self.predicates))
+
+    def compile(self, alias=None):
+        '''returns (where, params): a sql boolean expression (columns prefixed with alias) and its parameters'''
+        prefix = alias + '.' if alias else ''
+        clauses = []
+        params = []
+        for column, value in self.predicates:
+            col = '{0}"{1}"'.format(prefix, column)
+            if isinstance(value, tuple) and len(value) == 2 and str(value[0]).lower() in OPERATORS:
+                clauses.append('{0} {1} ?'.format(col, OPERATORS[value[0].lower()]))
+                params.append(value[1])
+            elif isinstance(value, (list, tuple, set)):
+                value = list(value)
+                clauses.append('{0} IN ({1})'.format(col, ','.join('?' * len(value))) if value else '0')
+                params.extend(value)
+            else:
+                clauses.append('{0} = ?'.format(col))
+                params.append(value)
+        return ' AND '.join(clauses) or '1', params
@@ -0,0 +1,199 @@
+'''
+columnar sidecar cache of an EnergyPlus sql file's ReportData, stored next to the sql file
+as memory-mappable numpy arrays so repeat reads of any series are slices instead of table scans.
+
+layout of the cache directory:
+    values.npy      ReportData.Value, sorted by series then TimeIndex
+    timeindex.npy   ReportData.TimeIndex in the same order
+    series.npy      sorted ReportDataDictionaryIndex of every cached series
+    offsets.npy     start of each series in values/timeindex (len(series) + 1)
+    dictionary.pkl  ReportDataDictionary
+    time.pkl        Time table with the 'dt' column built by SqlSeries._maketime
+    key.json        size, mtime and sampled hash of the sql file the cache was built from
+'''
+
+import os
+import json
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+
+
+
+def file_key(fname, sample=2**20):
+    '''size, mtime and sha1 of the first and last `sample` bytes of a file'''
+    st = os.stat(fname)
+    sha = hashlib.sha1(str(st.st_size).encode())
+    with open(fname, 'rb') as f:
+        sha.update(f.read(sample))
+        if st.st_size > sample:
+            f.seek(max(st.st_size - sample, sample))
+            sha.update(f.read(sample))
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'sha1': sha.hexdigest()}
+
+
+
+class SeriesCache:
+    '''sidecar ReportData cache for one sql file; built on first use and rebuilt whenever the sql file changes.
+    args:
+        sqlfile: sqlfile path
+        cachedir (optional): cache directory, defaults to <simname>.seriescache next to the sql file'''
+    def __init__(self, sqlfile, cachedir=None):
+        if ".sql" not in sqlfile:
+            sqlfile = sqlfile + '.sql'
+        self.sqlfile = sqlfile
+        self.cachedir = cachedir or sqlfile.replace(".sql", "") + '.seriescache'
+        self._key = None
+        self._arrays = None
+        self._time = None
+
+
+    # helper functions
+    def _path(self, name):
+        return os.path.join(self.cachedir, name)
+
+    def _stat_matches(self):
+        '''cheap check of the loaded cache against the sql file'''
+        st = os.stat(self.sqlfile)
+        return self._key is not None and (st.st_size, st.st_mtime_ns) == (self._key['size'], self._key['mtime_ns'])
+
+    def _load(self):
+        self._arrays = {name: np.load(self._path(name + '.npy'), mmap_mode='r')
+                        for name in ('values', 'timeindex', 'series', 'offsets')}
+        self._time = None
+
+    def _stored_key(self):
+        try:
+            with open(self._path('key.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+    # public functions
+    def valid(self):
+        '''True if the cache on disk was built from the current sql file'''
+        stored = self._stored_key()
+        return stored is not None and stored == file_key(self.sqlfile)
+
+    def ensure(self, sqlseries):
+        '''loads the cache, building it first from sqlseries if it is missing or stale'''
+        if self._arrays is not None and self._stat_matches():
+            return
+        key = file_key(self.sqlfile)
+        if self._stored_key() != key:
+            self.build(sqlseries, key)
+        self._key = key
+        self._load()
+
+    def build(self, sqlseries, key=None, blocksize=2**18):
+        '''writes the cache atomically from two unordered scans of ReportData: one counting the rows of each
+        series, one placing rows at their series' offsets (a counting sort, so sqlite never sorts the table).
+        series whose rows were not stored in TimeIndex order are then sorted in place'''
+        key = key or file_key(self.sqlfile)
+        session = sqlseries.session
+        tmpdir = '{0}.tmp-{1}'.format(self.cachedir, os.getpid())
+        if os.path.exists(tmpdir):
+            shutil.rmtree(tmpdir)
+        os.makedirs(tmpdir)
+
+        counts = np.zeros(0, dtype='int64')
+        cur = session.execute('SELECT "ReportDataDictionaryIndex" FROM "ReportData"')
+        while True:
+            rows = cur.fetchmany(blocksize)
+            if not rows:
+                break
+            blockcounts = np.bincount(np.array(rows, dtype='int64').reshape(-1))
+            if len(blockcounts) > len(counts):
+                counts = np.concatenate([counts, np.zeros(len(blockcounts) - len(counts), dtype='int64')])
+            counts[:len(blockcounts)] += blockcounts
+        series = np.flatnonzero(counts)
+        offsets = np.concatenate([[0], np.cumsum(counts[series])]).astype('int64')
+        nrows = int(offsets[-1])
+
+        values = np.lib.format.open_memmap(os.path.join(tmpdir, 'values.npy'), mode='w+', dtype='float64', shape=(nrows,))
+        timeindex = np.lib.format.open_memmap(os.path.join(tmpdir, 'timeindex.npy'), mode='w+', dtype='int64', shape=(nrows,))
+        fill = offsets[:-1].copy()
+        cur = session.execute('SELECT "ReportDataDictionaryIndex", "Value", "TimeIndex" FROM "ReportData"')
+        while True:
+            rows = cur.fetchmany(blocksize)
+            if not rows:
+                break
+            block = np.array(rows, dtype='float64').reshape(-1, 3)
+            pos = np.searchsorted(series, block[:, 0].astype('int64'))
+            order = np.argsort(pos, kind='stable')
+            group, first, size = np.unique(pos[order], return_index=True, return_counts=True)
+            rank = np.arange(len(order)) - np.repeat(first, size)
+            dest = np.empty(len(order), dtype='int64')
+            dest[order] = np.repeat(fill[group], size) + rank
+            fill[group] += size
+            values[dest] = block[:, 1]
+            timeindex[dest] = block[:, 2]
+
+        for start, end in zip(offsets[:-1].tolist(), offsets[1:].tolist()):
+            t = timeindex[start:end]
+            if end - start > 1 and (np.diff(t) < 0).any():
+                order = np.argsort(t, kind='stable')
+                values[start:end] = values[start:end][order]
+                timeindex[start:end] = t[order]
+        values.flush()
+        timeindex.flush()
+        del values, timeindex
+
+        np.save(os.path.join(tmpdir, 'series.npy'), series.astype('int64'))
+        np.save(os.path.join(tmpdir, 'offsets.npy'), offsets)
+        sqlseries._dictionary().to_pickle(os.path.join(tmpdir, 'dictionary.pkl'))
+        sqlseries._maketime().to_pickle(os.path.join(tmpdir, 'time.pkl'))
+        with open(os.path.join(tmpdir, 'key.json'), 'w') as f:
+            json.dump(key, f)
+
+        self._arrays = None
+        if os.path.exists(self.cachedir):
+            shutil.rmtree(self.cachedir)
+        os.replace(tmpdir, self.cachedir)
+
+    def clear(self):
+        '''removes the cache directory'''
+        self._arrays = None
+        self._key = None
+        self._time = None
+        if os.path.exists(self.cachedir):
+            shutil.rmtree(self.cachedir)
+
+    def dictionary(self):
+        return pd.read_pickle(self._path('dictionary.pkl'))
+
+    def time(self):
+        if self._time is None:
+            self._time = pd.read_pickle(self._path('time.pkl'))
+        return self._time
+
+    def series(self, idx):
+        '''(values, timeindex) memmap slices of one series; empty if the series has no data'''
+        series = self._arrays['series']
+        pos = np.searchsorted(series, idx)
+        if pos >= len(series) or series[pos] != idx:
+            return self._arrays['values'][:0], self._arrays['timeindex'][:0]
+        start, end = self._arrays['offsets'][pos], self._arrays['offsets'][pos + 1]
+        return self._arrays['values'][start:end], self._arrays['timeindex'][start:end]
+
+    def read(self, idxlist, times=None):
+        '''(Value, ReportDataDictionaryIndex, TimeIndex) arrays for the series in idxlist,
+        optionally only the TimeIndex values in times (sorted)'''
+        values, rddi, timeidx = [], [], []
+        for idx in idxlist:
+            v, t = self.series(idx)
+            if times is not None:
+                lo = np.searchsorted(t, times[0], side='left') if len(times) else 0
+                hi = np.searchsorted(t, times[-1], side='right') if len(times) else 0
+                v, t = v[lo:hi], t[lo:hi]
+                mask = np.isin(t, times)
+                if not mask.all():
+                    v, t = v[mask], t[mask]
+            values.append(v)
+            timeidx.append(t)
+            rddi.append(np.full(len(v), idx, dtype='int64'))
+        if not values:
+            return np.empty(0), np.empty(0, dtype='int64'), np.empty(0, dtype='int64')
+        return np.concatenate(values), np.concatenate(rddi), np.concatenate(timeidx)
@@ -0,0 +1,184 @@
+'''
+read-only sqlite session shared by the sql loaders (SqlSeries and SqlTables),
+so a single .sql file is opened and its schema parsed once per epLoad.
+'''
+
+import os
+import sqlite3
+import pathlib
+import datetime
+import pandas as pd
+
+
+# stay below sqlite's default limit on bound variables (999 before 3.32)
+MAX_SQL_PARAMS = 900
+
+# indexes created by SqlSession.prepare (EnergyPlus writes none on these tables)
+PREPARE_INDEXES = [
+    ('epparse_reportdata_series', 'ReportData', ['ReportDataDictionaryIndex', 'TimeIndex', 'Value']),
+    ('epparse_tabulardata_table', 'TabularData', ['ReportNameIndex', 'ReportForStringIndex', 'TableNameIndex']),
+    ]
+
+# records that (and from which source file) a database was prepared
+PREPARED_TABLE = 'epparse_prepared'
+
+
+class SqlSession:
+    '''single read-only connection to an EnergyPlus sql file.
+    the connection is opened lazily on first query and reopened if used after close().
+    args:
+        sqlfile: sqlfile path
+        mmap_size (optional): bytes of the file sqlite may memory-map
+        cache_size (optional): page cache size in KiB
+        cached_statements (optional): number of prepared statements kept for reuse'''
+    def __init__(self, sqlfile, mmap_size=2**30, cache_size=65536, cached_statements=256):
+        if ".sql" not in sqlfile:
+            sqlfile = sqlfile + '.sql'
+        self.sqlfile = sqlfile
+        self.mmap_size = mmap_size
+        self.cache_size = cache_size
+        self.cached_statements = cached_statements
+        self.sidecar = sqlfile.replace(".sql", "") + '.prepared.sql'
+        self._conn = None
+        self.dbfile = None
+
+
+    # helper functions
+    def _uri(self, fname):
+        '''read-only, immutable uri: sqlite skips locking and change detection on the file'''
+        path = pathlib.Path(os.path.abspath(fname)).as_uri()
+        return path + '?mode=ro&immutable=1'
+
+    def _source_key(self):
+        st = os.stat(self.sqlfile)
+        return st.st_size, st.st_mtime_ns
+
+    def _prepared_record(self, fname):
+        '''(source size, source mtime) stored in fname by prepare, or None if it isn't prepared'''
+        try:
+            conn = sqlite3.connect(self._uri(fname), uri=True)
+            try:
+                return conn.execute('SELECT source_size, source_mtime_ns FROM "{0}"'.format(PREPARED_TABLE)).fetchone()
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            return None
+
+    def _valid_sidecar(self):
+        return os.path.isfile(self.sidecar) and self._prepared_record(self.sidecar) == self._source_key()
+
+    def _index(self, conn):
+        '''creates the covering indexes, ANALYZE statistics and the prepared record'''
+        for name, table, columns in PREPARE_INDEXES:
+            conn.execute('CREATE INDEX IF NOT EXISTS "{0}" ON "{1}" ({2})'.format(
+                name, table, ', '.join('"{0}"'.format(c) for c in columns)))
+        conn.execute('ANALYZE')
+        conn.execute('CREATE TABLE IF NOT EXISTS "{0}" (source_size INTEGER, source_mtime_ns INTEGER, '
+                     'prepared_at TEXT)'.format(PREPARED_TABLE))
+        conn.execute('DELETE FROM "{0}"'.format(PREPARED_TABLE))
+
+    def _connect(self):
+        if not os.path.isfile(self.sqlfile):
+            raise FileNotFoundError(self.sqlfile)
+        self.dbfile = self.sidecar if self._valid_sidecar() else self.sqlfile
+        conn = sqlite3.connect(self._uri(self.dbfile), uri=True, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        conn.execute("PRAGMA mmap_size = {0}".format(int(self.mmap_size)))
+        conn.execute("PRAGMA cache_size = {0}".format(-int(self.cache_size)))
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+
+    # public functions
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = self._connect()
+        return self._conn
+
+    @property
+    def closed(self):
+        return self._conn is None
+
+    def df_query(self, query, params=None):
+        '''makes query (native sql, optionally parameterized) and returns df'''
+        return pd.read_sql(query, self.conn, params=params)
+
+    def execute(self, query, params=()):
+        '''makes query and returns the sqlite cursor'''
+        return self.conn.execute(query, params)
+
+    def temp_ids(self, name, ids):
+        '''fills temp table `name` (one integer column 'id') with ids, for joins on id lists
+        longer than the sql variable limit. returns the qualified table name'''
+        table = 'temp."{0}"'.format(name)
+        conn = self.conn
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS "{0}" (id INTEGER PRIMARY KEY)'.format(name))
+        conn.execute('DELETE FROM {0}'.format(table))
+        conn.executemany('INSERT OR IGNORE INTO {0} VALUES (?)'.format(table), ((int(i),) for i in ids))
+        return table
+
+    @property
+    def prepared(self):
+        '''True if the sql file, or a current sidecar copy of it, has been prepared'''
+        return self._prepared_record(self.sqlfile) is not None or self._valid_sidecar()
+
+    def prepare(self, inplace=False):
+        '''opt-in: creates covering indexes (ReportData by series and time, TabularData by table) and ANALYZE
+        statistics so single-series and single-table lookups are index seeks instead of table scans.
+        writes a sidecar copy (<simname>.prepared.sql) that sessions on this file open instead from then on;
+        sessions already open keep reading the unchanged sql file. does nothing if already prepared.
+        args:
+            inplace (optional): write into the sql file itself if it is writable (no copy). sessions open the
+                file immutable, so every other session and batch worker on it must be closed first; a
+                SeriesCache of the file is rebuilt on next use.
+        returns the path of the prepared database'''
+        if self._prepared_record(self.sqlfile) is not None:
+            return self.sqlfile
+        if self._valid_sidecar():
+            return self.sidecar
+
+        self.close()
+        if inplace and os.access(self.sqlfile, os.W_OK) and os.access(os.path.dirname(os.path.abspath(self.sqlfile)), os.W_OK):
+            try:
+                conn = sqlite3.connect(self.sqlfile)
+                with conn:
+                    self._index(conn)
+                    conn.execute('INSERT INTO "{0}" VALUES (NULL, NULL, ?)'.format(PREPARED_TABLE),
+                                 (datetime.datetime.now().isoformat(),))
+                conn.close()
+                return self.sqlfile
+            except sqlite3.OperationalError:
+                conn.close()
+
+        key = self._source_key()
+        tmpfile = self.sidecar + '.tmp'
+        source = sqlite3.connect(self._uri(self.sqlfile), uri=True)
+        conn = sqlite3.connect(tmpfile)
+        source.backup(conn)
+        source.close()
+        with conn:
+            self._index(conn)
+            conn.execute('INSERT INTO "{0}" VALUES (?, ?, ?)'.format(PREPARED_TABLE),
+                         (key[0], key[1], datetime.datetime.now().isoformat()))
+        conn.close()
+        os.replace(tmpfile, self.sidecar)
+        return self.sidecar
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def __getstate__(self):
+        '''connections can't be pickled; a copied session reopens on first use'''
+        state = self.__dict__.copy()
+        state['_conn'] = None
+        return state
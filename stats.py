@@ -0,0 +1,156 @@
+'''
+per-stage instrumentation of the loaders (SqlSeries, SqlTables, ReadEso).
+
+    stats = ep.stats.Stats(callback=print, memory=True)
+    sim = ep.epLoad(pathtosim, stats=stats)
+    sim.sql.getseries('BLOCK5')
+    stats.to_frame()
+
+every public call is one group of records (call, call_id, file) with one record per stage:
+stage name, wall time (seconds), rows read, bytes produced and, if memory=True, the peak python
+memory allocated during the stage (tracemalloc; slow). the whole call is recorded as stage 'total'.
+stages can run inside other stages (i.e. the Time table query inside 'window'): each record names its
+enclosing stage as 'parent', and self_seconds leaves out the time of the stages inside it, so the
+self_seconds of a call's records add up to its total.
+loaders without a Stats object use a shared no-op stage, so instrumentation costs nothing when disabled.
+'''
+
+import time
+import itertools
+import contextlib
+import tracemalloc
+import pandas as pd
+
+
+
+RECORD_FIELDS = ['call', 'call_id', 'file', 'stage', 'parent', 'seconds', 'self_seconds', 'rows', 'bytes', 'peak_bytes']
+
+
+
+class _NullStage:
+    '''no-op stage used when instrumentation is disabled; the yielded record is thrown away'''
+    def __enter__(self):
+        return {}
+
+    def __exit__(self, *exc):
+        return False
+
+NULL_STAGE = _NullStage()
+
+
+def stage(stats, name, **info):
+    '''stats.stage(name, **info), or a no-op if stats is None'''
+    if stats is None:
+        return NULL_STAGE
+    return stats.stage(name, **info)
+
+
+def call(stats, name, **info):
+    '''stats.call(name, **info), or a no-op if stats is None'''
+    if stats is None:
+        return NULL_STAGE
+    return stats.call(name, **info)
+
+
+
+class Stats:
+    '''collects stage records from the loaders it is passed to.
+    args:
+        callback (optional): called with each record (a dict) as soon as it is complete
+        memory (optional): record peak allocated memory per stage with tracemalloc (slows calls down)'''
+    def __init__(self, callback=None, memory=False):
+        self.callback = callback
+        self.memory = memory
+        self.records = []
+        self._ids = itertools.count(1)
+        self._calls = []
+        self._mem = []
+        self._stages = []
+        self._started = False
+
+
+    # helper functions
+    def _fold(self, peak):
+        for m in self._mem:
+            m[1] = max(m[1], peak)
+
+    def _mem_enter(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+        current, peak = tracemalloc.get_traced_memory()
+        self._fold(peak)
+        tracemalloc.reset_peak()
+        self._mem.append([current, current])
+
+    def _mem_exit(self):
+        current, peak = tracemalloc.get_traced_memory()
+        self._fold(peak)
+        start, high = self._mem.pop()
+        if not self._mem and self._started:
+            tracemalloc.stop()
+            self._started = False
+        return high - start
+
+    def _add(self, record):
+        self.records.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+
+    ## public functions
+    @contextlib.contextmanager
+    def call(self, name, **info):
+        '''groups the stages run inside it as one call; yields the 'total' record'''
+        self._calls.append((name, next(self._ids), info.pop('file', None)))
+        try:
+            with self.stage('total', **info) as record:
+                yield record
+        finally:
+            self._calls.pop()
+
+    @contextlib.contextmanager
+    def stage(self, name, **info):
+        '''times the block inside it; the yielded record can be given 'rows' and 'bytes' (or any other field)'''
+        callname, callid, fname = self._calls[-1] if self._calls else (None, None, None)
+        parent = self._stages[-1] if self._stages else None
+        record = {'call': callname, 'call_id': callid, 'file': fname, 'stage': name,
+                  'parent': parent[0] if parent else None, 'seconds': None, 'self_seconds': None,
+                  'rows': None, 'bytes': None, 'peak_bytes': None}
+        record.update(info)
+        if self.memory:
+            self._mem_enter()
+        # [name, seconds of the stages inside this one]
+        self._stages.append([name, 0.0])
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            record['self_seconds'] = record['seconds'] - self._stages.pop()[1]
+            if parent:
+                parent[1] += record['seconds']
+            if self.memory:
+                record['peak_bytes'] = self._mem_exit()
+            self._add(record)
+
+    def clear(self):
+        self.records = []
+
+    def to_records(self):
+        '''list of record dicts, in order of completion'''
+        return [dict(r) for r in self.records]
+
+    def to_frame(self):
+        '''records as a df'''
+        df = pd.DataFrame(self.records)
+        extra = [c for c in df.columns if c not in RECORD_FIELDS]
+        return df.reindex(columns=RECORD_FIELDS + extra)
+
+    def summary(self):
+        '''total seconds, self seconds, rows and bytes and number of records per (call, stage, parent stage).
+        self_seconds sums without counting nested stages twice'''
+        df = self.to_frame()
+        return df.groupby(['call', 'stage', 'parent'], sort=False, dropna=False).agg(
+            count=('stage', 'size'), seconds=('seconds', 'sum'), self_seconds=('self_seconds', 'sum'),
+            rows=('rows', 'sum'), bytes=('bytes', 'sum'))
@@ -2,10 +2,14 @@
 set of functions to open sql file, find table name, and parse it into a usable format as a dataframe.
 '''
 
-import sqlite3
 import warnings
+import collections.abc
+import numpy as np
 import pandas as pd
 
+from .session import SqlSession
+from .stats import stage, call
+from .tabularindex import TabularIndex, TableHandle
 
 
 strtypeidx = {
@@ -18,16 +22,80 @@ strtypeidx = {
             }
 
 
+# columns get_tabular appends to every table
+TABLE_NAME_COLUMNS = [('ReportName', ''), ('ReportForString', ''), ('TableName', '')]
+
+
+def _columns(rows, ncols):
+    '''list of fetched sql rows -> list of ncols object arrays'''
+    if not rows:
+        return [np.empty(0, dtype=object) for _ in range(ncols)]
+    return [np.array(c, dtype=object) for c in zip(*rows)]
+
+
+def _write_archive(df, fname):
+    ext = fname.lower().rsplit('.', 1)[-1]
+    if ext == 'parquet':
+        df.to_parquet(fname, index=False)
+    elif ext in ('h5', 'hdf', 'hdf5'):
+        df.to_hdf(fname, key='tabular', mode='w', format='table', data_columns=['ReportName', 'TableName'])
+    else:
+        raise ValueError("archive must be a .parquet or .h5/.hdf file, not '{0}'".format(fname))
+
+
+
+class TabularTables(collections.abc.Mapping):
+    '''read-only mapping of (ReportName, ReportForString, TableName) -> table df, as returned by
+    SqlTables.get_all_tabular(lazy=True). the rows of every table are already read; each table is
+    pivoted on first access and kept. a tabledict (as for get_tabular) can be used as the key too.'''
+    def __init__(self, build, groups, columns):
+        self._build = build
+        self._groups = groups
+        self._columns = columns
+        self._frames = {}
+
+    def _key(self, key):
+        if isinstance(key, dict):
+            key = (key['ReportName'], key['ReportForString'], key['TableName'])
+        return tuple(key)
+
+    def __getitem__(self, key):
+        key = self._key(key)
+        if key not in self._frames:
+            rows = self._groups[key]
+            tabledict = dict(zip(['ReportName', 'ReportForString', 'TableName'], key))
+            self._frames[key] = self._build(tabledict, *[c[rows] for c in self._columns])
+        return self._frames[key]
+
+    def __contains__(self, key):
+        return self._key(key) in self._groups
+
+    def __iter__(self):
+        return iter(self._groups)
+
+    def __len__(self):
+        return len(self._groups)
+
+
+
 class SqlTables:
     '''creates table from available sql output reports.
     args:
         sqlfile: sqlfile path
         tablename = i.e. "Comfort and Setpoint Not Met Summary"
-        reportname (optional): for specifying reportname if there are more than identically-named tables in multiple reports'''
-    def __init__(self, sqlfile):
+        reportname (optional): for specifying reportname if there are more than identically-named tables in multiple reports
+        session (optional): SqlSession to share an open connection (epLoad passes its own)
+        stats (optional): stats.Stats that records per-stage timings of each avail_tabular/get_tabular call'''
+    def __init__(self, sqlfile, session=None, stats=None):
         if ".sql" not in sqlfile:
             sqlfile = sqlfile + '.sql'
         self.sqlfile = sqlfile
+        self.session = session if session is not None else SqlSession(sqlfile)
+        self.stats = stats
+        self._tables = None
+        self._strings = None
+        self._table_keys = None
+        self._index = None
 
 
     # helper functions
@@ -43,12 +111,9 @@ class SqlTables:
         tabledf[string_col] = tabledf[lookup_col].apply(lambda x: stringdict[x])
         return tabledf
 
-    def _df_query(self, query):
-        '''opens sql, makes query (native sql), closes sql and returns df'''
-        conn = sqlite3.connect(self.sqlfile)
-        df = pd.read_sql((query), conn)
-        conn.close()
-        return df
+    def _df_query(self, query, params=None):
+        '''makes query (native sql) on the shared session and returns df'''
+        return self.session.df_query(query, params)
 
     def _df_to_tabledict(self, df):
         '''takes dataframe populated from either "_filter_tabular" or "avail_tabular" and returns list of dicts for "get_tabular"'''
@@ -64,21 +129,94 @@ class SqlTables:
     def _filter_tabular(self, filterquery):
         '''search available tabulardata for any string, return dataframe'''
         avail = self.avail_tabular()
-        df = avail[avail.apply(lambda row: row.astype(str).str.contains(filterquery).any(), axis=1)]
+        df = avail[avail.apply(lambda col: col.astype(str).str.contains(filterquery)).any(axis=1)]
         return df
 
-    def _tryfloat(self, val):
-        try:
-            val = float(val.strip().replace(" ",""))
-        except:
-            val = val
-        return val
-
-    def _floatdf(self, df):
+    def _stringarray(self):
+        '''Strings.Value as an object array indexed by StringIndex, loaded once'''
+        if self._strings is None:
+            with stage(self.stats, 'strings') as rec:
+                rows = self.session.execute('SELECT "StringIndex", "Value" FROM "Strings"').fetchall()
+                rec['rows'] = len(rows)
+            size = max([r[0] for r in rows], default=-1) + 1
+            self._strings = np.empty(size, dtype=object)
+            for idx, value in rows:
+                self._strings[idx] = value
+        return self._strings
+
+    def _table_indices(self, tabledict):
+        '''Strings indices (ReportName, ReportForString, TableName) of a table'''
+        if self._table_keys is None:
+            catalog = self._catalog()
+            self._table_keys = dict(zip(
+                zip(catalog['ReportName'], catalog['ReportForString'], catalog['TableName']),
+                zip(catalog['ReportNameIndex'].tolist(), catalog['ReportForStringIndex'].tolist(), catalog['TableNameIndex'].tolist())))
+        key = (tabledict['ReportName'], tabledict['ReportForString'], tabledict['TableName'])
+        if key not in self._table_keys:
+            raise KeyError("no tabular report table {0}".format(key))
+        return self._table_keys[key]
+
+    def _catalog(self):
+        '''every (ReportName, ReportForString, TableName) in order of first appearance in TabularData,
+        with their Strings indices, from one GROUP BY join; built once'''
+        if self._tables is None:
+            query = '''SELECT rn."Value", rf."Value", tn."Value", td."ReportNameIndex", td."ReportForStringIndex", td."TableNameIndex"
+                FROM (SELECT "ReportNameIndex", "ReportForStringIndex", "TableNameIndex", MIN("TabularDataIndex") AS first
+                      FROM "TabularData" GROUP BY "ReportNameIndex", "ReportForStringIndex", "TableNameIndex") td
+                JOIN "Strings" rn ON rn."StringIndex" = td."ReportNameIndex"
+                JOIN "Strings" rf ON rf."StringIndex" = td."ReportForStringIndex"
+                JOIN "Strings" tn ON tn."StringIndex" = td."TableNameIndex"
+                ORDER BY td.first'''
+            with stage(self.stats, 'query') as rec:
+                rows = self.session.execute(query).fetchall()
+                rec['rows'] = len(rows)
+            self._tables = pd.DataFrame(rows, columns=['ReportName', 'ReportForString', 'TableName',
+                                                       'ReportNameIndex', 'ReportForStringIndex', 'TableNameIndex'])
+        return self._tables
+
+    def _floatdf(self, df, failures=None):
+        '''df with its value columns parsed to float in bulk (whitespace and thousands separators removed):
+        all-numeric columns become float, text columns stay text and mixed columns get floats only where
+        a cell parses. the ReportName, ReportForString and TableName columns are left as they are.
+        missing, empty and whitespace-only cells are blank. if failures is a list, (RowName, column, value)
+        of every non-blank cell left as text in a column that has numbers is appended to it'''
         floatdf = df.copy()
-        for col in floatdf.columns:
-            floatdf[col] = floatdf[col].apply(lambda x: self._tryfloat(x))
-            
+        positions = [i for i, col in enumerate(df.columns) if col not in TABLE_NAME_COLUMNS]
+        if not positions or not len(df):
+            return floatdf
+        block = df.iloc[:, positions].to_numpy(dtype=object)
+        num = np.full(block.shape, np.nan)
+        slow = []
+        for j in range(block.shape[1]):
+            try:
+                num[:, j] = block[:, j].astype('float64')
+            except (TypeError, ValueError):
+                slow.append(j)
+
+        blank = np.zeros(block.shape, dtype=bool)
+        if slow:
+            # columns with text or blanks: coerced in one pass, and only rejected cells pay for the string cleanup
+            flat = pd.Series(block[:, slow].ravel())
+            slownum = pd.to_numeric(flat, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+            slowblank = flat.isna().to_numpy()
+            retry = np.isnan(slownum) & ~slowblank
+            if retry.any():
+                text = flat[retry].astype(str)
+                slowblank[retry] = (text.str.strip() == '').to_numpy()
+                cleaned = text.str.replace(r'[\s,]', '', regex=True)
+                slownum[retry] = pd.to_numeric(cleaned, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+            num[:, slow] = slownum.reshape(len(block), len(slow))
+            blank[:, slow] = slowblank.reshape(len(block), len(slow))
+
+        parsed = ~np.isnan(num)
+        for j, pos in enumerate(positions):
+            if j not in slow or (parsed[:, j] | blank[:, j]).all():
+                floatdf.isetitem(pos, num[:, j])
+            elif parsed[:, j].any():
+                floatdf.isetitem(pos, np.where(parsed[:, j], num[:, j].astype(object), block[:, j]))
+                if failures is not None:
+                    unparsed = ~(parsed[:, j] | blank[:, j])
+                    failures.extend((row, df.columns[pos], value) for row, value in zip(df.index[unparsed], block[unparsed, j]))
         return floatdf
 
 
@@ -86,52 +224,161 @@ class SqlTables:
     # pulling tabulardata tables (i.e. results)
     def avail_tabular(self):
         '''return dataframe of all available tables (with tablename, reportfor, reportname)'''
-        tablename = self._df_query("SELECT * FROM 'Strings' WHERE StringTypeIndex = 3")
-        reportfor = self._df_query("SELECT * FROM 'Strings' WHERE StringTypeIndex = 2")
-        reportname = self._df_query("SELECT * FROM 'Strings' WHERE StringTypeIndex = 1")
-        tabulardata = self._df_query("SELECT * FROM 'TabularData'")
-        strings = self._df_query("SELECT * FROM 'Strings'")
-        stringdict = self._df_cols_to_dict(strings, 'StringIndex', 'Value')
-        get_strs = ['ReportNameIndex', 'ReportForStringIndex', 'TableNameIndex']
-        for string in get_strs:
-            tabulardata = self._idx_to_str(tabulardata, stringdict, string)
-            tabulardata.drop(string, axis=1, inplace=True)
-        tables = tabulardata[['ReportName', 'ReportForString', 'TableName']].drop_duplicates()
+        with call(self.stats, 'avail_tabular', file=self.sqlfile) as total:
+            tables = self._catalog()[['ReportName', 'ReportForString', 'TableName']].copy()
+            total['rows'] = len(tables)
         return tables
 
 
-    def get_tabular(self, tabledict):
+    def get_tabular(self, tabledict, unparsed=False):
         '''returns single table given table dictionary:
         table['ReportName']
         table['ReportForString']
         table['TableName']
+        if unparsed, df.attrs['unparsed'] lists (RowName, column, value) of the cells left as text
+        in columns that are otherwise numeric
         '''
-        reportnameidx = int(self._df_query("SELECT * FROM 'Strings' WHERE StringTypeIndex = 1 and Value = '{0}'".format(tabledict['ReportName']))['StringIndex'])
-        reportforidx = int(self._df_query("SELECT * FROM 'Strings' WHERE StringTypeIndex = 2 and Value = '{0}'".format(tabledict['ReportForString']))['StringIndex'])
-        tablenameidx = int(self._df_query("SELECT * FROM 'Strings' WHERE StringTypeIndex = 3 and Value = '{0}'".format(tabledict['TableName']))['StringIndex'])
-
-        tablestr = self._df_query("SELECT * FROM 'TabularData' WHERE TableNameIndex = {0} AND ReportForStringIndex = {1} AND ReportNameIndex = {2}".format(tablenameidx, reportforidx, reportnameidx))
-        strings = self._df_query("SELECT * FROM 'Strings'")
-
-        stringdict = self._df_cols_to_dict(strings, 'StringIndex', 'Value')
-        idxcols = [col for col in tablestr.columns if "Index" in col and "TabularDataIndex" not in col]
-        for col in idxcols:
-            df = self._idx_to_str(tablestr, stringdict, col)
-
-        df = df[[col for col in df.columns if "Index" not in col]]
-        coldict = self._df_cols_to_dict(df, 'ColumnId', 'ColumnName')
-        colunitdict = self._df_cols_to_dict(df, 'ColumnId', 'Units')
-        rowdict = self._df_cols_to_dict(df, 'RowId', 'RowName')
-        valdf = df[['RowId', 'ColumnId', 'Value']].pivot(columns='ColumnId', index='RowId', values='Value')
-        valdf.columns = pd.MultiIndex.from_tuples([(coldict[col], colunitdict[col]) for col in valdf.columns])
-        valdf.index = [rowdict[row] for row in valdf.index]
-
-        valdf['ReportName'] = tabledict['ReportName']
-        valdf['ReportForString'] = tabledict['ReportForString']
-        valdf['TableName'] = tabledict['TableName']
-        valdf = self._floatdf(valdf)
+        with call(self.stats, 'get_tabular', file=self.sqlfile) as total:
+            reportnameidx, reportforidx, tablenameidx = self._table_indices(tabledict)
+            with stage(self.stats, 'query') as rec:
+                rows = self.session.execute(
+                    'SELECT "RowId", "ColumnId", "RowNameIndex", "ColumnNameIndex", "UnitsIndex", "Value" FROM "TabularData" '
+                    'WHERE "ReportNameIndex" = ? AND "ReportForStringIndex" = ? AND "TableNameIndex" = ?',
+                    (reportnameidx, reportforidx, tablenameidx)).fetchall()
+                rec['rows'] = len(rows)
+
+            valdf = self._table_frame(tabledict, *_columns(rows, 6), unparsed=unparsed)
+            total['rows'] = len(valdf)
         return valdf
 
+    def get_all_tabular(self, reportname=None, lazy=False, archive=None):
+        '''returns every table (or those of reportname, a report name or list of them) from one pass over
+        TabularData, as a dict of (ReportName, ReportForString, TableName): df in avail_tabular order.
+        each df is the same as get_tabular returns.
+        args:
+            reportname (optional): report name or list of report names
+            lazy (optional): return a TabularTables mapping that pivots each table on first access
+            archive (optional): also write all tables in long format (one row per cell, with the report,
+                for, table, row, column and units names and the raw text Value) to one file:
+                .parquet (needs pyarrow or fastparquet) or .h5/.hdf (needs pytables, key 'tabular')'''
+        with call(self.stats, 'get_all_tabular', file=self.sqlfile) as total:
+            catalog = self._catalog()
+            where, params = '', []
+            if reportname is not None:
+                names = [reportname] if isinstance(reportname, str) else list(reportname)
+                catalog = catalog[catalog['ReportName'].isin(names)]
+                indices = sorted(set(catalog['ReportNameIndex'].tolist()))
+                where = 'WHERE "ReportNameIndex" IN ({0})'.format(','.join('?' * len(indices)))
+                params = indices
+            strings = self._stringarray()
+            with stage(self.stats, 'query') as rec:
+                rows = self.session.execute(
+                    'SELECT "ReportNameIndex", "ReportForStringIndex", "TableNameIndex", "RowId", "ColumnId", '
+                    '"RowNameIndex", "ColumnNameIndex", "UnitsIndex", "Value" FROM "TabularData" ' + where, params).fetchall()
+                rec['rows'] = len(rows)
+
+            with stage(self.stats, 'group'):
+                columns = _columns(rows, 9)
+                keys = pd.MultiIndex.from_arrays([catalog['ReportNameIndex'].values, catalog['ReportForStringIndex'].values,
+                                                  catalog['TableNameIndex'].values]) if len(catalog) else None
+                pos = keys.get_indexer(pd.MultiIndex.from_arrays([c.astype('int64') for c in columns[:3]])) \
+                    if len(catalog) and len(rows) else np.empty(0, dtype='int64')
+                order = np.argsort(pos, kind='stable')
+                bounds = np.searchsorted(pos[order], np.arange(len(catalog) + 1))
+                groups = collections.OrderedDict()
+                for i, tabledict in enumerate(catalog[['ReportName', 'ReportForString', 'TableName']].to_dict('records')):
+                    groups[tuple(tabledict.values())] = order[bounds[i]:bounds[i + 1]]
+
+            if archive is not None:
+                with stage(self.stats, 'archive') as rec:
+                    long = pd.DataFrame({
+                        'ReportName': strings[columns[0][order].astype('int64')],
+                        'ReportForString': strings[columns[1][order].astype('int64')],
+                        'TableName': strings[columns[2][order].astype('int64')],
+                        'RowId': columns[3][order].astype('int64'),
+                        'ColumnId': columns[4][order].astype('int64'),
+                        'RowName': strings[columns[5][order].astype('int64')],
+                        'ColumnName': strings[columns[6][order].astype('int64')],
+                        'Units': strings[columns[7][order].astype('int64')],
+                        'Value': columns[8][order],
+                        })
+                    _write_archive(long, archive)
+                    rec['rows'] = len(long)
+
+            tables = TabularTables(self._table_frame, groups, columns[3:])
+            total['rows'] = len(tables)
+            if not lazy:
+                tables = collections.OrderedDict((key, tables[key]) for key in tables)
+        return tables
+
+    def _table_frame(self, tabledict, rowid, colid, rowname, colname, units, values, unparsed=False):
+        '''pivots the TabularData rows of one table (RowId, ColumnId, RowNameIndex, ColumnNameIndex, UnitsIndex,
+        Value arrays) into the get_tabular df: (ColumnName, Units) columns, RowName index'''
+        strings = self._stringarray()
+        with stage(self.stats, 'pivot'):
+            rowids, rowpos = np.unique(rowid.astype('int64'), return_inverse=True)
+            colids, colpos = np.unique(colid.astype('int64'), return_inverse=True)
+
+            matrix = np.full((len(rowids), len(colids)), np.nan, dtype=object)
+            matrix[rowpos, colpos] = values
+            rownames = np.empty(len(rowids), dtype=object)
+            rownames[rowpos] = strings[rowname.astype('int64')]
+            colnames = np.empty(len(colids), dtype=object)
+            colnames[colpos] = strings[colname.astype('int64')]
+            colunits = np.empty(len(colids), dtype=object)
+            colunits[colpos] = strings[units.astype('int64')]
+
+            valdf = pd.DataFrame(matrix, index=pd.Index(rownames, dtype=object),
+                                 columns=pd.MultiIndex.from_arrays([colnames, colunits]))
+            valdf['ReportName'] = tabledict['ReportName']
+            valdf['ReportForString'] = tabledict['ReportForString']
+            valdf['TableName'] = tabledict['TableName']
+        with stage(self.stats, 'floatdf'):
+            failures = [] if unparsed else None
+            valdf = self._floatdf(valdf, failures)
+            if unparsed:
+                valdf.attrs['unparsed'] = failures
+        return valdf
+
+    def tabular_index(self, fts=None):
+        '''TabularIndex over the report, for, table, row and column names of every table, built once.
+        fts forces (True) or disables (False) sqlite FTS5; by default it is used if available'''
+        if self._index is None or (fts is not None and fts != self._index.fts):
+            catalog = self._catalog()
+            keys = ['ReportNameIndex', 'ReportForStringIndex', 'TableNameIndex']
+            position = {k: i for i, k in enumerate(zip(*[catalog[c].tolist() for c in keys]))}
+            strings = self._stringarray()
+            names = {'RowNameIndex': [set() for _ in position], 'ColumnNameIndex': [set() for _ in position]}
+            with stage(self.stats, 'index_query') as rec:
+                nrows = 0
+                for col, found in names.items():
+                    rows = self.session.execute('SELECT DISTINCT "ReportNameIndex", "ReportForStringIndex", "TableNameIndex", "{0}" '
+                                                'FROM "TabularData"'.format(col)).fetchall()
+                    for r in rows:
+                        found[position[r[:3]]].add(r[3])
+                    nrows += len(rows)
+                rec['rows'] = nrows
+            documents = [(t[0], t[1], t[2],
+                          [strings[i] for i in sorted(names['RowNameIndex'][p])],
+                          [strings[i] for i in sorted(names['ColumnNameIndex'][p])])
+                         for p, t in enumerate(catalog[['ReportName', 'ReportForString', 'TableName']].values.tolist())]
+            with stage(self.stats, 'index_build'):
+                self._index = TabularIndex(documents, fts)
+        return self._index
+
+    def find_tables(self, query, limit=50):
+        '''ranked search of table, report, row and column names (see tabularindex.py for the query syntax),
+        i.e. 'unmet hours' or 'row:"COIL COOLING DX 1"'. returns TableHandles, best match first;
+        tables are not loaded until handle.get() (or get_tabular(handle))'''
+        with call(self.stats, 'find_tables', file=self.sqlfile) as total:
+            index = self.tabular_index()
+            with stage(self.stats, 'search') as rec:
+                found = index.search(query, limit)
+                rec['rows'] = len(found)
+            handles = [TableHandle(self, *index.documents[pos][:3], score=score) for pos, score in found]
+            total['rows'] = len(handles)
+        return handles
+
     def search_tabular(self, filter):
         '''searches any string of available tabular reports and returns list of dataframes with matching in table names'''
         dflist = [self.get_tabular(filterdict) for filterdict in self._df_to_tabledict(self._filter_tabular(filter))]
@@ -0,0 +1,220 @@
+'''
+ranked full-text search over the tabular reports of an sql file: one document per table with its
+report name, report-for string, table name, row names and column names. built once per SqlTables
+(see SqlTables.find_tables) in an in-memory sqlite FTS5 table, or an in-process inverted index if
+this sqlite has no FTS5. only names are indexed; tables are loaded when a handle's get() is called.
+
+queries are whitespace-separated terms that must all match (case-insensitive):
+    unmet hours                 words anywhere in a table's names
+    "Unmet Hours"               quoted: phrase (words next to each other in one name)
+    coil:cooling:dx             punctuated names are phrases of their words
+    setpoint*                   trailing *: prefix
+    table:"site and source"     field-qualified: report, for, table, row or column
+'''
+
+import re
+import math
+import bisect
+import sqlite3
+import numpy as np
+
+
+
+FIELDS = ['report', 'for', 'table', 'row', 'column']
+
+# bm25 weight per field: a hit in the table name counts most
+FIELD_WEIGHTS = [2.0, 0.5, 4.0, 1.0, 1.0]
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+TERM_RE = re.compile(r'(?:([A-Za-z]+):)?("[^"]*"\*?|\S+)')
+
+
+
+def _words(text):
+    return WORD_RE.findall(str(text).lower()) if text is not None else []
+
+
+def fts5_available():
+    try:
+        conn = sqlite3.connect(':memory:')
+        conn.execute('CREATE VIRTUAL TABLE t USING fts5(a)')
+        conn.close()
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+
+class TableHandle:
+    '''search result: names of one table plus its score, without its contents.
+    works as a tabledict for get_tabular; get() loads the table'''
+    def __init__(self, tables, reportname, reportfor, tablename, score):
+        self._tables = tables
+        self.ReportName = reportname
+        self.ReportForString = reportfor
+        self.TableName = tablename
+        self.score = score
+
+    def __repr__(self):
+        return 'TableHandle({0!r}, {1!r}, {2!r}, score={3:.3f})'.format(
+            self.ReportName, self.ReportForString, self.TableName, self.score)
+
+    def __getitem__(self, key):
+        return self.to_dict()[key]
+
+    def to_dict(self):
+        return {'ReportName': self.ReportName, 'ReportForString': self.ReportForString, 'TableName': self.TableName}
+
+    def get(self, **kwargs):
+        '''the table as get_tabular returns it'''
+        return self._tables.get_tabular(self.to_dict(), **kwargs)
+
+
+
+class TabularIndex:
+    '''search index over table names.
+    args:
+        documents: list of (ReportName, ReportForString, TableName, row names, column names), one per table
+        fts (optional): True/False to force or disable FTS5 (default: use it if available)'''
+    def __init__(self, documents, fts=None):
+        self.documents = documents
+        self.fts = fts5_available() if fts is None else fts
+        self._conn = None
+        self._postings = None
+        if self.fts:
+            self._build_fts()
+        else:
+            self._build_inverted()
+
+
+    # helper functions
+    def _build_fts(self):
+        conn = sqlite3.connect(':memory:', check_same_thread=False)
+        conn.execute('CREATE VIRTUAL TABLE docs USING fts5({0}, tokenize="unicode61")'.format(
+            ', '.join('"{0}"'.format(f) for f in FIELDS)))
+        conn.executemany('INSERT INTO docs (rowid, "report", "for", "table", "row", "column") VALUES (?, ?, ?, ?, ?, ?)',
+                         ((i, d[0], d[1], d[2], '\n'.join(d[3]), '\n'.join(d[4])) for i, d in enumerate(self.documents)))
+        self._conn = conn
+
+    def _build_inverted(self):
+        '''token -> {doc: per-field term counts}, plus each doc's names as word tuples for phrase checks'''
+        self._postings = {}
+        self._names = []
+        self._lengths = np.zeros((len(self.documents), len(FIELDS)))
+        for i, doc in enumerate(self.documents):
+            names = [[doc[0]], [doc[1]], [doc[2]], doc[3], doc[4]]
+            fieldwords = []
+            for f, values in enumerate(names):
+                words = [tuple(_words(v)) for v in values]
+                fieldwords.append(words)
+                for w in words:
+                    self._lengths[i, f] += len(w)
+                    for token in w:
+                        counts = self._postings.setdefault(token, {}).setdefault(i, [0] * len(FIELDS))
+                        counts[f] += 1
+            self._names.append(fieldwords)
+        self._tokens = sorted(self._postings)
+        self._avglen = self._lengths.mean(axis=0) if len(self.documents) else np.ones(len(FIELDS))
+
+    def _parse(self, query):
+        '''list of (field position or None, words, prefix)'''
+        terms = []
+        for match in TERM_RE.finditer(query):
+            field, pattern = match.groups()
+            if field and field.lower() in FIELDS:
+                field = FIELDS.index(field.lower())
+            else:
+                field, pattern = None, match.group(0)
+            prefix = pattern.endswith('*')
+            pattern = pattern.rstrip('*')
+            words = _words(pattern.strip('"'))
+            if words:
+                terms.append((field, words, prefix))
+        return terms
+
+    def _fts_query(self, terms):
+        parts = []
+        for field, words, prefix in terms:
+            phrase = '"{0}"'.format(' '.join(words)) + ('*' if prefix else '')
+            parts.append('"{0}" : {1}'.format(FIELDS[field], phrase) if field is not None else phrase)
+        return ' AND '.join(parts)
+
+    def _search_fts(self, terms, limit):
+        query = 'SELECT rowid, -bm25(docs, {0}) AS score FROM docs WHERE docs MATCH ? ORDER BY score DESC'.format(
+            ', '.join(str(w) for w in FIELD_WEIGHTS))
+        if limit:
+            query += ' LIMIT {0}'.format(int(limit))
+        return self._conn.execute(query, (self._fts_query(terms),)).fetchall()
+
+    def _matches(self, doc, field, words, prefix):
+        '''True if the word sequence occurs (the last word as a prefix, if prefix) in one name of doc'''
+        fields = range(len(FIELDS)) if field is None else [field]
+        n = len(words)
+        for f in fields:
+            for name in self._names[doc][f]:
+                for start in range(len(name) - n + 1):
+                    window = name[start:start + n]
+                    if window[:-1] == tuple(words[:-1]) and (
+                            window[-1].startswith(words[-1]) if prefix else window[-1] == words[-1]):
+                        return True
+        return False
+
+    def _term_tokens(self, words, prefix):
+        '''indexed tokens per word of a term (the last word expanded if prefix)'''
+        tokens = [[w] if w in self._postings else [] for w in words]
+        if prefix:
+            lo = bisect.bisect_left(self._tokens, words[-1])
+            hi = bisect.bisect_left(self._tokens, words[-1] + '\uffff')
+            tokens[-1] = self._tokens[lo:hi]
+        return tokens
+
+    def _search_inverted(self, terms, limit):
+        ndocs = len(self.documents)
+        weights = np.array(FIELD_WEIGHTS)
+        mask = np.ones(len(FIELDS))
+        scores = None
+        for field, words, prefix in terms:
+            tokens = self._term_tokens(words, prefix)
+            candidates = None
+            for wordtokens in tokens:
+                docs = set()
+                for token in wordtokens:
+                    docs.update(self._postings[token])
+                candidates = docs if candidates is None else candidates & docs
+            if field is not None:
+                mask = (np.arange(len(FIELDS)) == field).astype('float64')
+            termscores = {}
+            for doc in candidates or ():
+                if not self._matches(doc, field, words, prefix):
+                    continue
+                score = 0.0
+                for wordtokens in tokens:
+                    for token in wordtokens:
+                        posting = self._postings[token]
+                        if doc not in posting:
+                            continue
+                        counts = np.array(posting[doc], dtype='float64') * mask
+                        idf = math.log(1 + (ndocs - len(posting) + 0.5) / (len(posting) + 0.5))
+                        # bm25 term frequency saturation per field (k1=1.2, b=0.75)
+                        norm = counts * 2.2 / (counts + 1.2 * (0.25 + 0.75 * self._lengths[doc] / np.maximum(self._avglen, 1)))
+                        score += idf * float((weights * norm).sum())
+                termscores[doc] = score
+            mask = np.ones(len(FIELDS))
+            if scores is None:
+                scores = termscores
+            else:
+                scores = {d: s + termscores[d] for d, s in scores.items() if d in termscores}
+        ranked = sorted((scores or {}).items(), key=lambda x: (-x[1], x[0]))
+        return ranked[:limit] if limit else ranked
+
+
+    ## public functions
+    def search(self, query, limit=None):
+        '''[(document position, score)] of the documents matching every term of query, best first'''
+        terms = self._parse(query)
+        if not terms:
+            return []
+        if self.fts:
+            return self._search_fts(terms, limit)
+        return self._search_inverted(terms, limit)
@@ -0,0 +1,4 @@
+'''
+behaviour tests, run from the package directory with:
+    python -m pytest tests
+'''
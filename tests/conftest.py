@@ -0,0 +1,27 @@
+import warnings
+import pytest
+
+from ..benchmarks import generate
+
+
+# small enough to write in well under a second, with design days, several frequencies and meters
+FIXTURE = dict(n_series=4, timesteps=2, days=40, design_days=2, n_tables=3)
+
+
+@pytest.fixture(autouse=True)
+def _quiet():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', FutureWarning)
+        yield
+
+
+@pytest.fixture(scope='session')
+def base(tmp_path_factory):
+    '''base path (no extension) of a shared eplusout.sql/.bnd/.eso; tests must not change these files'''
+    return generate.write_fixtures(str(tmp_path_factory.mktemp('sim')), **FIXTURE)
+
+
+@pytest.fixture
+def own_base(tmp_path):
+    '''base path of fixtures written for one test, which may change them'''
+    return generate.write_fixtures(str(tmp_path), **FIXTURE)
@@ -0,0 +1,53 @@
+import pandas as pd
+
+from ..catalog import SeriesCatalog, RDD_COLUMNS
+
+
+ROWS = [
+    (1, 0, 'Avg', 'Zone', 'Zone', 'BLOCK1:ZONE1', 'Zone Air Temperature', 'Hourly', '', 'C'),
+    (2, 0, 'Avg', 'Zone', 'Zone', 'BLOCK1:ZONE2', 'Zone Air Temperature', 'Hourly', '', 'C'),
+    (3, 0, 'Avg', 'Zone', 'Zone', 'BLOCK2:ZONE1', 'Zone Air Temperature', 'Daily', '', 'C'),
+    (4, 0, 'Avg', 'Zone', 'Zone', 'BLOCK1:ZONE1', 'Zone Mean Air Temperature', 'Hourly', '', 'C'),
+    (5, 0, 'Avg', 'HVAC', 'HVAC System', 'ZONE 1 AIR NODE', 'System Node Temperature', 'Hourly', '', 'C'),
+    (6, 1, 'Sum', 'Facility:Electricity', 'Zone', '', 'Electricity:Facility', 'Monthly', '', 'J'),
+    ]
+
+
+def _catalog():
+    return SeriesCatalog(pd.DataFrame(ROWS, columns=RDD_COLUMNS))
+
+
+def _ids(catalog, query):
+    return catalog.search(query)['ReportDataDictionaryIndex'].tolist()
+
+
+def test_unqualified_words_are_one_phrase():
+    assert _ids(_catalog(), 'Zone Air Temperature') == [1, 2, 3]
+    assert _ids(_catalog(), 'zone air temperature') == [1, 2, 3]
+    assert _ids(_catalog(), 'Air Temperature') == [1, 2, 3, 4]
+
+
+def test_phrase_with_field_terms():
+    catalog = _catalog()
+    assert _ids(catalog, 'Zone Air Temperature freq:hourly') == [1, 2]
+    assert _ids(catalog, 'freq:hourly Zone Air Temperature key:BLOCK1*') == [1, 2]
+    assert _ids(catalog, 'Zone Temperature') == []
+
+
+def test_field_terms():
+    catalog = _catalog()
+    assert _ids(catalog, 'key:BLOCK1*') == [1, 2, 4]
+    assert _ids(catalog, 'key:ZONE1*') == []
+    assert _ids(catalog, 'name:"Zone Air Temperature"') == [1, 2, 3]
+    assert _ids(catalog, 'name:"zone air"') == []
+    assert _ids(catalog, 'units:/^(C|F)$/ freq:daily') == [3]
+    assert _ids(catalog, 'meter:1') == [6]
+    assert _ids(catalog, 'key:*ZONE1') == [1, 3, 4]
+
+
+def test_unknown_field_is_text():
+    assert _ids(_catalog(), 'Facility:Electricity') == [6]
+
+
+def test_empty_query_matches_everything():
+    assert _ids(_catalog(), '') == [1, 2, 3, 4, 5, 6]
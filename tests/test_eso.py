@@ -0,0 +1,132 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+
+from ..eso import ReadEso, EsoTail, STAMP_CODES
+from ..esoindex import EsoIndex
+from ..esoconvert import convert_eso, EsoColumns
+
+
+STAMP_IDS = set(str(c) for c in STAMP_CODES)
+
+
+def _reports(file):
+    eso = ReadEso(file)
+    return eso, eso.reports.rpt_idx.tolist()
+
+
+def _split_eso(file):
+    '''(dictionary lines including 'End of Data Dictionary', data lines) of an eso file, as bytes'''
+    with open(file, 'rb') as f:
+        lines = f.read().splitlines(True)
+    end = next(i for i, line in enumerate(lines) if b'End of Data Dictionary' in line) + 1
+    return lines[:end], lines[end:]
+
+
+def _tail_file(tmp_path, chunks):
+    '''writes chunks one by one to a new eso file, yielding its path after each'''
+    fname = str(tmp_path / 'running.eso')
+    open(fname, 'wb').close()
+    for chunk in chunks:
+        with open(fname, 'ab') as f:
+            f.write(chunk)
+        yield fname
+
+
+def test_index_matches_get_report(base, tmp_path):
+    eso, idxs = _reports(base + '.eso')
+    indexdir = str(tmp_path / 'index')
+    indexed = ReadEso(base + '.eso', index=True)
+    indexed.index = EsoIndex(base + '.eso', indexdir)
+    for idx in idxs:
+        pd.testing.assert_frame_equal(indexed.get_report(idx), eso.get_report(idx))
+    assert indexed.index.valid()
+
+
+def test_index_rebuilt_after_eso_changes(own_base):
+    fname = own_base + '.eso'
+    index = EsoIndex(fname)
+    index.ensure()
+    before = index.read(7).copy()
+    with open(fname, 'rb') as f:
+        text = f.read()
+    first = text.index(b'\n7,', text.index(b'End of Data Dictionary')) + 3
+    with open(fname, 'wb') as f:
+        f.write(text[:first] + b'-' + text[first:])
+    assert not index.valid()
+    index.ensure()
+    assert index.read(7)[0, 0] == -before[0, 0]
+    np.testing.assert_array_equal(index.read(7)[1:], before[1:])
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_converter_matches_get_report(base, tmp_path, workers):
+    eso, idxs = _reports(base + '.eso')
+    outdir = convert_eso(base + '.eso', str(tmp_path / 'cols'), workers=workers, chunksize=2000)
+    columns = EsoColumns(outdir)
+    pd.testing.assert_frame_equal(columns.reports, eso.reports)
+    for idx in idxs:
+        pd.testing.assert_frame_equal(columns.get_report(idx), eso.get_report(idx))
+
+
+def test_tail_in_uneven_pieces_matches_get_report(base, tmp_path):
+    eso, idxs = _reports(base + '.eso')
+    with open(base + '.eso', 'rb') as f:
+        data = f.read()
+    rng = np.random.default_rng(0)
+    cuts = np.unique(rng.integers(1, len(data), 60))
+    chunks = [data[a:b] for a, b in zip(np.concatenate([[0], cuts]), np.concatenate([cuts, [len(data)]]))]
+
+    files = _tail_file(tmp_path, chunks)
+    tail = EsoTail(next(files))
+    polled = {}
+    for _ in [None] + list(files):
+        for idx, df in tail.poll().items():
+            polled.setdefault(idx, []).append(df)
+    assert tail.complete
+    for idx in idxs:
+        expected = eso.get_report(idx)
+        pd.testing.assert_frame_equal(pd.concat(polled[idx]), expected)
+        pd.testing.assert_frame_equal(tail.get_report(idx), expected)
+
+
+def test_tail_holds_back_the_last_block(base, tmp_path):
+    dictionary, lines = _split_eso(base + '.eso')
+    stamps = [i for i, line in enumerate(lines) if line.split(b',', 1)[0].decode() in STAMP_IDS]
+    # environment line, first time stamp and its data lines; then the next time stamp
+    first, second = stamps[1], stamps[2]
+    chunks = [b''.join(dictionary + lines[:second]), lines[second]]
+
+    files = _tail_file(tmp_path, chunks)
+    tail = EsoTail(next(files))
+    assert tail.poll() == {}
+    assert not tail.complete
+
+    next(files)
+    new = tail.poll()
+    expected = set(line.split(b',', 1)[0].decode() for line in lines[first + 1:second])
+    assert set(new) == expected
+    assert all(len(df) == 1 for df in new.values())
+
+
+def test_tail_starts_over_when_the_file_shrinks(base, tmp_path):
+    eso, idxs = _reports(base + '.eso')
+    with open(base + '.eso', 'rb') as f:
+        data = f.read()
+    fname = str(tmp_path / 'running.eso')
+    with open(fname, 'wb') as f:
+        f.write(data)
+    tail = EsoTail(fname)
+    tail.poll()
+
+    dictionary, lines = _split_eso(base + '.eso')
+    with open(fname, 'wb') as f:
+        f.write(b''.join(dictionary + lines[:len(lines) // 2]))
+    tail.poll()
+    assert not tail.complete
+    with open(fname, 'wb') as f:
+        f.write(data)
+    tail.poll()
+    assert tail.complete
+    pd.testing.assert_frame_equal(tail.get_report(idxs[0]), eso.get_report(idxs[0]))
@@ -0,0 +1,55 @@
+import os
+import sqlite3
+import numpy as np
+
+from ..load import epLoad
+from ..seriescache import SeriesCache
+
+
+def _read(base, cache, query='Zone Air Temperature'):
+    with epLoad(base, cache=cache) as sim:
+        return sim.sql.getseries(query, units='si')
+
+
+def test_cached_read_matches_sql(own_base):
+    expected = _read(own_base, False)
+    first = _read(own_base, True)
+    assert os.path.isdir(own_base + '.seriescache')
+    assert first.equals(expected)
+    assert _read(own_base, True).equals(expected)
+
+
+def test_cache_rebuilt_after_sql_changes(own_base):
+    _read(own_base, True)
+    cache = SeriesCache(own_base)
+    assert cache.valid()
+
+    conn = sqlite3.connect(own_base + '.sql')
+    with conn:
+        conn.execute('UPDATE ReportData SET Value = Value + 1000')
+    conn.close()
+    assert not cache.valid()
+
+    expected = _read(own_base, False)
+    assert _read(own_base, True).equals(expected)
+    assert cache.valid()
+
+
+def test_build_sorts_unordered_reportdata(own_base):
+    conn = sqlite3.connect(own_base + '.sql')
+    with conn:
+        conn.execute('CREATE TABLE shuffled AS SELECT * FROM ReportData ORDER BY TimeIndex DESC, '
+                     'ReportDataDictionaryIndex % 3')
+        conn.execute('DROP TABLE ReportData')
+        conn.execute('ALTER TABLE shuffled RENAME TO ReportData')
+        expected = np.array(conn.execute('SELECT ReportDataDictionaryIndex, Value, TimeIndex FROM ReportData '
+                                         'ORDER BY ReportDataDictionaryIndex, TimeIndex').fetchall())
+    conn.close()
+
+    with epLoad(own_base) as sim:
+        cache = SeriesCache(own_base)
+        cache.build(sim.sql, blocksize=97)
+    cache.ensure(None)
+    ids = np.repeat(cache._arrays['series'], np.diff(cache._arrays['offsets']))
+    got = np.column_stack([ids, cache._arrays['values'], cache._arrays['timeindex']])
+    assert np.array_equal(got, expected)
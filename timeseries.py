@@ -1,9 +1,90 @@
 import sys
 import os
+import re
+import datetime
 import glob as gb
 import sqlite3
+import numpy as np
 import pandas as pd
 
+from .session import SqlSession, MAX_SQL_PARAMS
+from .seriescache import SeriesCache
+from .catalog import SeriesCatalog, RDD_COLUMNS
+from .selector import Selector
+from .stats import stage, call
+
+
+# column levels of getseries results
+SERIES_COLUMNS = ['IndexGroup', 'TimestepType', 'KeyValue', 'Name', 'Units']
+
+# sql aggregate per getseries agg name ('argmax'/'argmin' are queried separately)
+AGGREGATES = {
+        'sum': 'SUM(r."Value")',
+        'mean': 'AVG(r."Value")',
+        'max': 'MAX(r."Value")',
+        'min': 'MIN(r."Value")',
+        'count': 'COUNT(r."Value")',
+        }
+
+# Time columns grouped on per getseries resample option
+RESAMPLE = {
+        'D': ['t."Month"', 't."Day"'],
+        'M': ['t."Month"'],
+        'hour_of_day': ['(t."Hour" * 60 + t."Minute" - t."Interval") / 60'],
+        }
+
+# si to ip factors and units: 'Air'/'Water' apply to volumetric flows by fluid, 'neutral' to everything else.
+# 'C' is converted with 1.8x+32
+UNIT_CONVERSIONS = {
+        'Air': {
+            'factor': {
+                'm3/s':2118
+                },
+            'units': {
+                'm3/s': 'cfm'
+                }
+        },
+        'Water': {
+            'factor': {
+                'm3/s':15850
+                },
+            'units': {
+                'm3/s':'gpm'
+                }
+        },
+        'neutral': {
+            'factor': {
+                'J': 0.000277778,
+                'grain/lb':7000,
+                'kg/s': 2.2,
+                'W': 3.412,
+                'kg': 2.2,
+                'm/s': 1.328084,
+                'W/m2': 10.7639,
+                'Pa': 0.000145038,
+                'hr': 1,
+                'deg': 1,
+                'ach': 1,
+                '%': 1,
+                '': 1,
+                },
+            'units': {
+                'J': 'W',
+                'grain/lb':'lb/lb',
+                'kg/s': 'lb/s',
+                'W': 'btu',
+                'kg': 'lb',
+                'm/s': 'ft/s',
+                'W/m2': 'W/ft2',
+                'Pa': 'psi',
+                'hr': 'hr',
+                'deg': 'deg',
+                'ach': 'ach',
+                '%': '%',
+                '': '',
+                }
+        }
+    }
 
 
 
@@ -12,8 +93,12 @@ class SqlSeries:
     args:
         sqlfile: sqlfile path
         tablename = i.e. "Comfort and Setpoint Not Met Summary"
-        reportname (optional): for specifying reportname if there are more than identically-named tables in multiple reports'''
-    def __init__(self, sqlfile):
+        reportname (optional): for specifying reportname if there are more than identically-named tables in multiple reports
+        session (optional): SqlSession to share an open connection (epLoad passes its own)
+        cache (optional): True (or a directory path) to read series from a columnar sidecar cache,
+            built next to the sql file on first use and rebuilt when the sql file changes
+        stats (optional): stats.Stats that records per-stage timings of each getseries/iter_series call'''
+    def __init__(self, sqlfile, session=None, cache=False, stats=None):
         if ".sql" not in sqlfile:
             sqlfile = sqlfile + '.sql'
             bndfile = sqlfile + '.bnd'
@@ -21,6 +106,16 @@ class SqlSeries:
         self.sqlfile = sqlfile
         self.bndfile = sqlfile.replace(".sql",".bnd")
         self.simname = sqlfile.replace(".sql","")
+        self.session = session if session is not None else SqlSession(sqlfile)
+        self._time = None
+        self._bnd = None
+        self._conv_plans = {}
+        self._catalog = None
+        self._catalog_stored = False
+        self.cache = None
+        if cache:
+            self.cache = SeriesCache(sqlfile, cache if isinstance(cache, str) else None)
+        self.stats = stats
 
 
     # private/helper functions (do i need the ones hashed out??)
@@ -38,154 +133,78 @@ class SqlSeries:
 
 
     def _bnd_node_dict(self):
-            with open(self.bndfile, 'r') as f:
-                bndlist = f.readlines()
-            
-            bndsplit = [x.replace("\n","").split(",") for x in bndlist]
-            
-            
-            nodedict = {}
-            for b in bndsplit:
-                if b[0].upper().replace(" ","") == "NODE" or b[0].upper().replace(" ","") == " SUSPICIOUSNODE":
-                    nodedict[b[2]] = b[3]
-            return nodedict
-
-
-    def _conv_units(self, df):
-        bnd_node_dict = self._bnd_node_dict()
-
- 
-        
-        convdict = {
-                'Air': {
-                    'factor': {
-                        'm3/s':2118
-                        },
-                    'units': {
-                        'm3/s': 'cfm'
-                        }
-                },
-                'Water': {
-                    'factor': {
-                        'm3/s':15850
-                        },
-                    'units': {
-                        'm3/s':'gpm'
-                        }
-                },
-                'neutral': {
-                    'factor': {
-                        'J': 0.000277778,
-                        'grain/lb':7000,
-                        'kg/s': 2.2,
-                        'W': 3.412,
-                        'C': '1.8x+32',
-                        'kg': 2.2,
-                        'm/s': 1.328084,
-                        'W/m2': 10.7639,
-                        'Pa': 0.000145038,
-                        'hr': 1,
-                        'ach': 1,
-                        '%': 1,
-                        },
-                    'units': {
-                        'J': 'W',
-                        'grain/lb':'lb/lb',
-                        'kg/s': 'lb/s',
-                        'W': 'btu',
-                        'C': 'F',
-                        'kg': 'lb',
-                        'hr': 'hr',
-                        'deg': 'deg',
-                        'm/s': 'ft/s',
-                        'W/m2': 'W/ft2',
-                        'Pa': 'psi',
-                        'hr': 'hr',
-                        'ach': 'ach',
-                        '%': '%',
-                    
-                        }
-                }
-            }
-
-        df = df.copy()
-        unitlist = []
-        for col in df.columns:
-            name = col[-2]
-            unit = col[-1]
-            keyval = col[-3]
-
-            try:
-                fname = bnd_node_dict[keyval]
-                fconv = convdict[fname]['factor'][unit]
-                funit = convdict[fname]['units'][unit]
-
-                if fconv != '1.8x+32':
-                    df[col] = df[col].apply(lambda x: x * fconv)                
-
-            except:
-
-                if unit in convdict['neutral']['units'].keys():
-                    fname = 'neutral'
-                    fconv = convdict['neutral']['factor'][unit]
-                    funit = convdict[fname]['units'][unit]
-                    
-                if unit == '':
-                    fname = 'neutral'
-                    fconv = 1
-                    funit = ''
-
-                if "AIR" in name.upper() or keyval.upper() in 'AIR OUTLET' or keyval.upper() in 'AIR INLET':
-                    fname = 'Air'
-                    try:
-                        funit = convdict[fname]['units'][unit]
-                    except:
-                        pass
-                    
-                if 'WATER' in name.upper() or keyval.upper() in 'WATER OUTLET' or keyval.upper() in 'WATER INLET':
-                    fname = 'Water'
-                    try:
-                        funit = convdict[fname]['units'][unit]
-                    except:
-                        pass
-
-                if unit == 'C':
-                    df[col] = df[col].apply(lambda x: (x * 1.8) + 32)
-                    funit = 'F'
-
-                if fconv != '1.8x+32':
-                    df[col] = df[col].apply(lambda x: x * fconv)
-                    
-            unitlist.append(funit)
-        
-        convcols = [list(elem) for elem in df.columns]
-
-        newconvcols = []
-        for num, conv in enumerate(convcols):
-
-            newlist = conv[:-1] + [unitlist[num]]
-            newconvcols.append(newlist)
-
-        newconvcols = list(map(list, zip(*newconvcols)))
-        idx = pd.MultiIndex.from_arrays(newconvcols)
-        
-        df.columns = idx
-
-        try:
-            df.drop('TimeIndex', axis=1, inplace=True)
-        except:
-            pass
-
-        return df
-
-
-
-    def _df_query(self, query):
-        '''opens sql, makes query (native sql), closes sql and returns df'''
-        conn = sqlite3.connect(self.sqlfile)
-        df = pd.read_sql(query, conn)
-        conn.close()
-        return df
+        '''node name: fluid type, parsed from the bnd file once per file'''
+        if self._bnd is not None:
+            return self._bnd
+
+        with open(self.bndfile, 'r') as f:
+            bndlist = f.readlines()
+
+        bndsplit = [x.replace("\n","").split(",") for x in bndlist]
+
+        nodedict = {}
+        for b in bndsplit:
+            if len(b) > 3 and b[0].upper().replace(" ","") in ("NODE", "SUSPICIOUSNODE"):
+                nodedict[b[2]] = b[3]
+        self._bnd = nodedict
+        return nodedict
+
+
+    def _conv_plan(self, keyval, name, unit):
+        '''returns (factor, offset, ip unit) for one series signature, so that ip = si * factor + offset.
+        volumetric flows on bnd nodes use the node fluid type; elsewhere the fluid is guessed from the
+        series name/key. plans are cached per (KeyValue, Name, Units).'''
+        sig = (keyval, name, unit)
+        if sig in self._conv_plans:
+            return self._conv_plans[sig]
+
+        fluid = self._bnd_node_dict().get(keyval)
+        if fluid not in ('Air', 'Water') and unit in UNIT_CONVERSIONS['Air']['factor']:
+            names = (name + ' ' + keyval).upper()
+            if 'WATER' in names:
+                fluid = 'Water'
+            elif 'AIR' in names:
+                fluid = 'Air'
+
+        if fluid in ('Air', 'Water') and unit in UNIT_CONVERSIONS[fluid]['factor']:
+            plan = (UNIT_CONVERSIONS[fluid]['factor'][unit], 0.0, UNIT_CONVERSIONS[fluid]['units'][unit])
+        elif unit == 'C':
+            plan = (1.8, 32.0, 'F')
+        elif unit in UNIT_CONVERSIONS['neutral']['factor']:
+            plan = (UNIT_CONVERSIONS['neutral']['factor'][unit], 0.0, UNIT_CONVERSIONS['neutral']['units'][unit])
+        else:
+            plan = (1.0, 0.0, unit)
+
+        self._conv_plans[sig] = plan
+        return plan
+
+
+    def _conv_units(self, df, inplace=False):
+        '''converts si columns (KeyValue, Name, Units as the last three column levels) to ip
+        with a single scale-and-offset over the value block. if inplace, the block of df may be
+        overwritten instead of copied.'''
+        if not len(df.columns):
+            return df if inplace else df.copy()
+        plans = [self._conv_plan(col[-3], col[-2], col[-1]) for col in df.columns]
+        factor = np.array([p[0] for p in plans])
+        offset = np.array([p[1] for p in plans])
+
+        values = df.to_numpy(copy=not inplace)
+        if values.dtype.kind != 'f':
+            values = values.astype('float64')
+        elif not values.flags.writeable:
+            values = values.copy()
+        values *= factor.astype(values.dtype)
+        values += offset.astype(values.dtype)
+
+        columns = pd.MultiIndex.from_tuples([tuple(col[:-1]) + (p[2],) for col, p in zip(df.columns, plans)])
+        return pd.DataFrame(values, index=df.index, columns=columns, copy=False)
+
+
+
+    def _df_query(self, query, params=None):
+        '''makes query (native sql) on the shared session and returns df'''
+        return self.session.df_query(query, params)
 
     def _df_to_tabledict(self, df):
         '''takes dataframe populated from either "_filter_tabular" or "avail_tabular" and returns list of dicts for "get_tabular"'''
@@ -198,115 +217,428 @@ class SqlSeries:
         return zipdict
 
 
-    def _filter_tabular(self, filterquery):
-        '''search available tabulardata for any string, return dataframe'''
-        avail = self.availseries()
-        df = avail[avail.apply(lambda row: row.astype(str).str.contains(filterquery).any(), axis=1)]
-        return df
-
-
     def _maketime(self):
-        timedf = self._df_query("SELECT * FROM Time WHERE Interval = 60")
-        def zeropad(val):
-            if len(str(val)) == 1:
-                val = '0' + str(val)
-                return val
+        '''returns the Time table indexed by TimeIndex with a 'dt' column, built once per file.
+        dt is the start of each reporting interval: timestep and hourly rows store the interval end
+        as Hour/Minute, daily rows are labelled by their day, monthly rows by the first of the month
+        and run period/annual rows by the first day of their environment.'''
+        if self._time is not None:
+            return self._time
+        if self._cache_valid():
+            self._time = self.cache.time()
+            return self._time
+
+        with stage(self.stats, 'time_query') as rec:
+            timedf = self._df_query("SELECT * FROM Time ORDER BY TimeIndex")
+            rec['rows'] = len(timedf)
+        with stage(self.stats, 'time_index') as rec:
+            timedf.index = timedf['TimeIndex'].values
+            if 'IntervalType' in timedf.columns:
+                intervaltype = timedf['IntervalType'].fillna(1).values
             else:
-                return val
-
-        timedf['Hour'] = timedf['Hour']-1
-        timedf['Month'] = timedf['Month'].apply(lambda x: zeropad(x))
-        timedf['Day'] = timedf['Day'].apply(lambda x: zeropad(x))
-        timedf['Hour'] = timedf['Hour'].apply(lambda x: zeropad(x))
-        timedf['dt'] =  timedf['Month'].astype(str) + "-" + timedf['Day'].astype(str)  + "-" + timedf['Hour'].astype(str)
-        dtformat = "%m-%d-%H"
-        timedf['dt'] = pd.to_datetime(timedf['dt'], format=dtformat)
+                intervaltype = np.ones(len(timedf))
+
+            month = timedf['Month'].fillna(1).values.astype(int)
+            day = timedf['Day'].fillna(1).values.astype(int)
+            day = np.where(intervaltype == 3, 1, day)
+            minutes = (timedf['Hour'].fillna(0) * 60 + timedf['Minute'].fillna(0) - timedf['Interval'].fillna(0)).values
+            minutes = np.where(intervaltype >= 2, 0, minutes)
+
+            # year is fixed at 1900, as with the original '%m-%d-%H' parse
+            dates = pd.to_datetime(pd.DataFrame({'year': 1900, 'month': month, 'day': day}))
+            dt = pd.Series(dates.values + pd.to_timedelta(minutes, unit='m').values, index=timedf.index)
+
+            longer = intervaltype >= 4
+            if longer.any():
+                days = intervaltype <= 2
+                envstart = dt[days].groupby(timedf['EnvironmentPeriodIndex'][days]).min()
+                dt[longer] = timedf['EnvironmentPeriodIndex'][longer].map(envstart).fillna(dt[longer]).values
+
+            timedf['dt'] = dt
+            rec['rows'] = len(timedf)
+        self._time = timedf
         return timedf
 
 
-    ## public functions
-    def availseries(self):
-        rddcols = [
-                'ReportDataDictionaryIndex',
-                'IsMeter', 
-                'Type', 	
-                'IndexGroup',
-                'TimestepType',
-                'KeyValue',
-                'Name',
-                'ReportingFrequency',
-                'ScheduleName',
-                'Units'
-                ]
-
-        df = self._df_query("SELECT * FROM ReportDataDictionary WHERE ReportingFrequency = 'Hourly'")
-        df.columns = rddcols
-        return df
-
-    def queryseries(self, filterquery):
-        df = self.availseries()
-        df = self._filter_tabular(filterquery)
+    def _window_key(self, value, end=False):
+        '''sortable month/day/minute key of a window bound: (month, day[, hour[, minute]]), 'MM-DD', or
+        anything pd.Timestamp takes (the year is ignored). date-only end bounds include the whole day:
+        (month, day), 'MM-DD', date strings without a time part ('2013-01-22') and datetime.date.
+        datetimes and pd.Timestamps are exact instants, even at midnight'''
+        dateonly = False
+        if isinstance(value, tuple):
+            parts = list(value) + [0] * (4 - len(value))
+            dateonly = len(value) == 2
+        elif isinstance(value, str) and re.match(r'^\d{1,2}-\d{1,2}$', value.strip()):
+            parts = [int(v) for v in value.strip().split('-')] + [0, 0]
+            dateonly = True
+        else:
+            ts = pd.Timestamp(value)
+            parts = [ts.month, ts.day, ts.hour, ts.minute]
+            if isinstance(value, str):
+                dateonly = not re.search(r'\d:\d|T\d', value)
+            else:
+                dateonly = isinstance(value, datetime.date) and not isinstance(value, datetime.datetime)
+        month, day, hour, minute = [int(p) for p in parts]
+        key = (month * 32 + day) * 1440 + hour * 60 + minute
+        if end and dateonly:
+            key += 1439
+        return key
+
+    def _times(self, start=None, end=None, months=None, daytypes=None, environment=None):
+        '''sorted TimeIndex values inside a time window, or None if no window is given'''
+        if start is None and end is None and months is None and daytypes is None and environment is None:
+            return None
+
+        time = self._maketime()
+        dt = pd.DatetimeIndex(time['dt'])
+        keep = np.ones(len(time), dtype=bool)
+
+        if start is not None or end is not None:
+            key = (dt.month.values * 32 + dt.day.values) * 1440 + dt.hour.values * 60 + dt.minute.values
+            lo = self._window_key(start) if start is not None else 0
+            hi = self._window_key(end, end=True) if end is not None else key.max()
+            if lo <= hi:
+                keep &= (key >= lo) & (key <= hi)
+            else:
+                # window wraps over the end of the year, i.e. start='12-01', end='02-28'
+                keep &= (key >= lo) | (key <= hi)
+
+        if months is not None:
+            months = [months] if np.isscalar(months) else months
+            keep &= np.isin(dt.month.values, [int(m) for m in months])
+
+        if daytypes is not None:
+            daytypes = [daytypes] if isinstance(daytypes, str) else daytypes
+            keep &= time['DayType'].fillna('').str.upper().isin([d.upper() for d in daytypes]).values
+
+        if environment is not None:
+            environment = [environment] if np.isscalar(environment) else environment
+            envs = self._df_query("SELECT EnvironmentPeriodIndex, EnvironmentName FROM EnvironmentPeriods")
+            names = dict(zip(envs['EnvironmentName'].str.upper(), envs['EnvironmentPeriodIndex']))
+            envidx = [names.get(e.upper(), -1) if isinstance(e, str) else int(e) for e in environment]
+            keep &= time['EnvironmentPeriodIndex'].isin(envidx).values
+
+        return time.index.values[keep]
+
+    def _time_filter(self, times):
+        '''(join, where, params) restricting ReportData (as r) to the sorted TimeIndex values in times:
+        a BETWEEN range if they are consecutive Time rows, else an IN list or temp table join'''
+        if not len(times):
+            return '', '0', []
+        alltimes = self._maketime().index.values
+        pos = np.searchsorted(alltimes, [times[0], times[-1]])
+        if pos[1] - pos[0] + 1 == len(times):
+            return '', 'r."TimeIndex" BETWEEN ? AND ?', [int(times[0]), int(times[-1])]
+        if len(times) > MAX_SQL_PARAMS:
+            table = self.session.temp_ids('epparse_time', times)
+            return 'JOIN {0} t ON t.id = r."TimeIndex"'.format(table), '1', []
+        return '', 'r."TimeIndex" IN ({0})'.format(','.join('?' * len(times))), [int(t) for t in times]
+
+    def _dictionary(self, where='', params=None):
+        '''ReportDataDictionary rows (optionally filtered by a sql where clause) with named columns'''
+        df = self._df_query("SELECT * FROM ReportDataDictionary " + where, params)
+        df.columns = RDD_COLUMNS
         return df
 
-
-    def getseries(self, query, units = 'ip'):
-        '''can pass in either a df made by using 'queryseries' 
-        or just a simple search term, or a list of indices'''
-
-        if type(query) == pd.DataFrame:
+    def _cache_valid(self):
+        return self.cache is not None and self.cache.valid()
+
+    def _stored_catalog(self):
+        '''the catalog if it was built from the series cache's stored dictionary, so dictionary rows can
+        be looked up without querying sqlite; None without a valid cache'''
+        if self.cache is None:
+            return None
+        catalog = self.catalog
+        return catalog if self._catalog_stored else None
+
+    def _as_selector(self, query):
+        '''Selector for a Selector/dict query, else None'''
+        if isinstance(query, Selector):
+            return query
+        if isinstance(query, dict):
+            return Selector(**query)
+        return None
+
+    def _select(self, query):
+        '''resolves a getseries query to the selected ReportDataDictionary rows,
+        sorted the way the getseries columns are'''
+        selector = self._as_selector(query)
+        if selector is not None:
+            where, params = selector.compile()
+            dfidx = self._dictionary('WHERE ' + where, params)
+        elif type(query) == pd.DataFrame:
             dfidx = query
-            idxlist = dfidx['ReportDataDictionaryIndex'].values.tolist()       
         elif type(query) == str:
             dfidx = self.queryseries(query)
-            idxlist = dfidx['ReportDataDictionaryIndex'].values.tolist()       
+        elif type(query) == list and self._stored_catalog() is not None:
+            frame = self.catalog.frame
+            dfidx = frame[frame['ReportDataDictionaryIndex'].isin([int(i) for i in query])]
         elif type(query) == list:
-            idxlist = query
-
-        serieslist = []
-
-        listquery = 'SELECT "Value","ReportDataDictionaryIndex","TimeIndex" FROM "ReportData" WHERE "ReportDataDictionaryIndex" IN '+str(tuple(dfidx.ReportDataDictionaryIndex))
-        df = self._df_query(listquery)
-        
-        time = self._maketime()[['TimeIndex', 'dt']]
-        
-        df = pd.merge(left = df, right = dfidx, on='ReportDataDictionaryIndex')
-        
-
-        df = pd.pivot_table(df, columns=['IndexGroup', 'TimestepType', 'KeyValue', 'Name', 'Units'], index='TimeIndex', values='Value')
-        
-
-        timedict = time.set_index('TimeIndex').to_dict()['dt']
-
-        df = df.reset_index()
-
-        df['dt'] = df.apply(lambda x: timedict[int(x['TimeIndex'].values[0])], axis=1)
-
-        df = df.set_index('dt', drop=True)
-
-        df = df.drop("TimeIndex", axis=1)
-   
-
-        
-        
-        
- 
-        
-        idx = pd.MultiIndex.from_tuples(list(df.columns))
-        
-        df.columns = idx
-
-
+            if len(query) > MAX_SQL_PARAMS:
+                table = self.session.temp_ids('epparse_series', query)
+                dfidx = self._dictionary('WHERE ReportDataDictionaryIndex IN (SELECT id FROM {0})'.format(table))
+            else:
+                where = 'WHERE ReportDataDictionaryIndex IN ({0})'.format(','.join('?' * len(query)))
+                dfidx = self._dictionary(where, [int(i) for i in query])
+        else:
+            raise TypeError("query must be a Selector, dict, DataFrame, search string or list of indices")
+
+        dfidx = dfidx.drop_duplicates('ReportDataDictionaryIndex')
+        return dfidx.sort_values(SERIES_COLUMNS + ['ReportDataDictionaryIndex']).reset_index(drop=True)
+
+    def _series_filter(self, dfidx, selector=None):
+        '''(join, where, params) restricting ReportData (as r) to the selected series: the selector
+        predicates on a ReportDataDictionary join, an IN list, or a temp table join for long lists'''
+        if selector is not None:
+            where, params = selector.compile('d')
+            join = 'JOIN "ReportDataDictionary" d ON d."ReportDataDictionaryIndex" = r."ReportDataDictionaryIndex"'
+            return join, where, params
+
+        idxlist = dfidx['ReportDataDictionaryIndex'].tolist()
+        if len(idxlist) > MAX_SQL_PARAMS:
+            table = self.session.temp_ids('epparse_series', idxlist)
+            return 'JOIN {0} s ON s.id = r."ReportDataDictionaryIndex"'.format(table), '1', []
+        return '', 'r."ReportDataDictionaryIndex" IN ({0})'.format(','.join('?' * len(idxlist))), idxlist
+
+    def _assemble(self, dfidx, values, rddi, timeidx, dtype='float64', envindex=False):
+        '''scatters ReportData (Value, ReportDataDictionaryIndex, TimeIndex) arrays into a wide df,
+        one column per dfidx row and one row per TimeIndex (indexed by dt, or (environment, dt) if envindex)'''
+        ncols = len(dfidx)
+        colpos = pd.Index(dfidx['ReportDataDictionaryIndex'].values).get_indexer(rddi)
+        rows, rowpos = np.unique(timeidx, return_inverse=True)
+
+        flat = rowpos * ncols + colpos
+        if len(flat) > 1 and (np.diff(np.sort(flat)) == 0).any():
+            raise ValueError("ReportData has more than one value for the same series and TimeIndex")
+
+        matrix = np.full((len(rows), ncols), np.nan, dtype=dtype)
+        matrix.reshape(-1)[flat] = values
+
+        time = self._maketime()
+        index = pd.DatetimeIndex(time['dt'].reindex(rows).values, name='dt')
+        if envindex:
+            envs = time['EnvironmentPeriodIndex'].reindex(rows).values.astype('int64')
+            index = pd.MultiIndex.from_arrays([envs, index], names=['environment', 'dt'])
+        columns = pd.MultiIndex.from_frame(dfidx[SERIES_COLUMNS], names=[None] * len(SERIES_COLUMNS))
+        return pd.DataFrame(matrix, index=index, columns=columns, copy=False)
+
+    def _read_block(self, dfidx, times=None, units='ip', dtype='float64', selector=None, envindex=False):
+        '''reads the series in dfidx (optionally only the sorted TimeIndex values in times)
+        and returns a wide df with one column per series. if given, selector (which dfidx was selected
+        with) is pushed into the ReportData query'''
+        if self.cache is not None:
+            with stage(self.stats, 'cache_read') as rec:
+                self.cache.ensure(self)
+                values, rddi, timeidx = self.cache.read(dfidx['ReportDataDictionaryIndex'].tolist(), times)
+                rec['rows'], rec['bytes'] = len(values), values.nbytes
+            return self._finish_block(dfidx, values, rddi, timeidx, units, dtype, envindex)
+
+        join, where, params = self._series_filter(dfidx, selector)
+        if times is not None:
+            timejoin, timewhere, timeparams = self._time_filter(times)
+            join, where, params = join + ' ' + timejoin, where + ' AND ' + timewhere, params + timeparams
+        listquery = 'SELECT r."Value", r."ReportDataDictionaryIndex", r."TimeIndex" FROM "ReportData" r {0} WHERE {1}'.format(join, where)
+
+        with stage(self.stats, 'query') as rec:
+            data = np.array(self.session.execute(listquery, params).fetchall(), dtype='float64').reshape(-1, 3)
+            rec['rows'], rec['bytes'] = len(data), data.nbytes
+        return self._finish_block(dfidx, data[:, 0], data[:, 1].astype('int64'), data[:, 2].astype('int64'), units, dtype,
+                                  envindex)
+
+    def _finish_block(self, dfidx, values, rddi, timeidx, units, dtype, envindex=False):
+        '''assembles ReportData arrays into the wide df and converts units'''
+        self._maketime()  # built (once) outside the 'assemble' stage
+        with stage(self.stats, 'assemble') as rec:
+            df = self._assemble(dfidx, values, rddi, timeidx, dtype, envindex)
+            rec['rows'], rec['bytes'] = len(df), df.values.nbytes
         if units == 'ip':
-            df = self._conv_units(df)
-        
+            with stage(self.stats, 'conv_units') as rec:
+                df = self._conv_units(df, inplace=True)
+                rec['rows'], rec['bytes'] = len(df), df.values.nbytes
         return df
 
-            
-
-
-
-        
 
+    def _aggregate(self, dfidx, resample, agg, times=None, units='ip', selector=None):
+        '''GROUP BY query of the series in dfidx joined to the Time table; one row per
+        (environment, resample period) and one column per series (and agg, if agg is a list)'''
+        if resample not in RESAMPLE:
+            raise ValueError("resample must be one of {0}".format(list(RESAMPLE)))
+        aggs = [agg] if isinstance(agg, str) else list(agg)
+        for a in aggs:
+            if a not in AGGREGATES and a not in ('argmax', 'argmin'):
+                raise ValueError("unknown agg '{0}'".format(a))
+
+        join, where, params = self._series_filter(dfidx, selector)
+        if times is not None:
+            timejoin, timewhere, timeparams = self._time_filter(times)
+            join, where, params = join + ' ' + timejoin, where + ' AND ' + timewhere, params + timeparams
+        if resample == 'hour_of_day':
+            where += ' AND t."Interval" < 1440'
+        else:
+            # run period and annual rows have no Month/Day to group by
+            where += ' AND COALESCE(t."IntervalType", 1) < 4'
+        join = 'JOIN "Time" t ON t."TimeIndex" = r."TimeIndex" ' + join
+        groupby = ['r."ReportDataDictionaryIndex"', 't."EnvironmentPeriodIndex"'] + RESAMPLE[resample]
+        nkeys = len(groupby)
+
+        sqlaggs = [a for a in aggs if a in AGGREGATES]
+        query = 'SELECT {0}, {1} COUNT(r."Value") FROM "ReportData" r {2} WHERE {3} GROUP BY {0}'.format(
+            ', '.join(groupby), ''.join(AGGREGATES[a] + ', ' for a in sqlaggs), join, where)
+        with stage(self.stats, 'aggregate_query') as rec:
+            data = np.array(self.session.execute(query, params).fetchall(), dtype='float64').reshape(-1, nkeys + len(sqlaggs) + 1)
+            rec['rows'], rec['bytes'] = len(data), data.nbytes
+        groups = pd.MultiIndex.from_arrays(data[:, :nkeys].T) if len(data) else None
+        results = {a: data[:, nkeys + i] for i, a in enumerate(sqlaggs)}
+        count = data[:, -1]
+
+        # sqlite returns the TimeIndex of the max/min row for a bare column next to a single MAX/MIN
+        for a in [a for a in aggs if a in ('argmax', 'argmin')]:
+            query = 'SELECT {0}, {1}(r."Value"), r."TimeIndex" FROM "ReportData" r {2} WHERE {3} GROUP BY {0}'.format(
+                ', '.join(groupby), 'MAX' if a == 'argmax' else 'MIN', join, where)
+            with stage(self.stats, a + '_query') as rec:
+                argdata = np.array(self.session.execute(query, params).fetchall(), dtype='float64').reshape(-1, nkeys + 2)
+                rec['rows'], rec['bytes'] = len(argdata), argdata.nbytes
+            results[a] = np.empty(0)
+            if len(data):
+                pos = pd.MultiIndex.from_arrays(argdata[:, :nkeys].T).get_indexer(groups)
+                results[a] = argdata[pos, -1]
+
+        # rows: (environment, period label)
+        labelname = 'hour' if resample == 'hour_of_day' else 'dt'
+        if resample == 'hour_of_day':
+            labels = data[:, 2].astype('int64')
+        else:
+            day = data[:, 3].astype(int) if resample == 'D' else 1
+            labels = pd.to_datetime(pd.DataFrame({'year': 1900, 'month': data[:, 2].astype(int), 'day': day})).values
+        rowkeys = pd.MultiIndex.from_arrays([data[:, 1].astype('int64'), labels], names=['environment', labelname])
+        rowpos, rows = pd.factorize(rowkeys, sort=True) if len(data) else (np.empty(0, dtype='int64'), rowkeys)
+        rows.names = ['environment', labelname]
+        colpos = pd.Index(dfidx['ReportDataDictionaryIndex'].values).get_indexer(data[:, 0].astype('int64'))
+
+        columns = [tuple(c) for c in dfidx[SERIES_COLUMNS].values]
+        if units == 'ip':
+            plans = [self._conv_plan(k, n, u) for k, n, u in dfidx[['KeyValue', 'Name', 'Units']].values]
+            factor = np.array([p[0] for p in plans], dtype='float64')[colpos]
+            offset = np.array([p[1] for p in plans], dtype='float64')[colpos]
+            columns = [c[:-1] + (p[2],) for c, p in zip(columns, plans)]
+
+        colindex = pd.MultiIndex.from_arrays([[c[i] for c in columns] for i in range(len(SERIES_COLUMNS))])
+        time = self._maketime()['dt']
+        frames = []
+        for a in aggs:
+            values = results[a]
+            if a in ('argmax', 'argmin'):
+                matrix = np.full((len(rows), len(dfidx)), np.datetime64('NaT'), dtype='datetime64[ns]')
+                values = time.reindex(values).values
+            else:
+                matrix = np.full((len(rows), len(dfidx)), np.nan)
+                if units == 'ip' and a != 'count':
+                    values = values * factor + offset * (count if a == 'sum' else 1)
+            matrix[rowpos, colpos] = values
+            frames.append(pd.DataFrame(matrix, index=rows, columns=colindex))
+
+        if isinstance(agg, str):
+            return frames[0]
+        # interleave so each series' aggregates sit next to each other, agg as the last level
+        order = [(a, c) for c in range(len(columns)) for a in range(len(aggs))]
+        df = pd.concat(frames, axis=1).iloc[:, [a * len(columns) + c for a, c in order]]
+        df.columns = pd.MultiIndex.from_arrays([[columns[c][i] for a, c in order] for i in range(len(SERIES_COLUMNS))]
+                                               + [[aggs[a] for a, c in order]])
+        return df
 
 
+    ## public functions
+    @property
+    def catalog(self):
+        '''SeriesCatalog of every series in the file (all reporting frequencies and meters), built once
+        (from the series cache's stored dictionary if the cache is valid)'''
+        if self._catalog is None:
+            self._catalog_stored = self._cache_valid()
+            dictionary = self.cache.dictionary() if self._catalog_stored else self._dictionary()
+            self._catalog = SeriesCatalog(dictionary)
+        return self._catalog
+
+    def availseries(self, frequency='Hourly'):
+        '''ReportDataDictionary rows of one reporting frequency, or of every series if frequency is None'''
+        if frequency is None:
+            return self.catalog.frame.copy()
+        return self.catalog.search('freq:"{0}"'.format(frequency)).reset_index(drop=True)
+
+    def queryseries(self, filterquery, frequency='Hourly'):
+        '''series matching a catalog query, i.e. 'BLOCK5' or 'key:BLOCK5* name:"Zone Air Temperature"'
+        (see catalog.py for the syntax). only series of the given reporting frequency are searched
+        unless frequency is None or the query has a freq: term'''
+        if frequency is not None and 'freq:' not in filterquery.lower():
+            filterquery = '{0} freq:"{1}"'.format(filterquery, frequency)
+        return self.catalog.search(filterquery).reset_index(drop=True)
+
+
+    def getseries(self, query, units = 'ip', dtype='float64', start=None, end=None, months=None, daytypes=None, environment=None,
+                  resample=None, agg='mean', envindex=False):
+        '''can pass in either a df made by using 'queryseries' 
+        or just a simple search term, or a list of indices,
+        or a Selector/dict of predicates evaluated inside sqlite (see selector.py).
+        dtype can be 'float32' to halve memory on large pulls.
+        envindex=True indexes rows by (environment, dt), with the EnvironmentPeriodIndex as the environment,
+        so sizing period and run period rows that share a date stay apart.
+
+        a time window is resolved against the Time table and only those rows are read:
+            start, end: (month, day[, hour[, minute]]), 'MM-DD' or a datetime (year ignored); both inclusive,
+                date-only ends ((month, day), 'MM-DD', '2013-01-22', datetime.date) include the whole day,
+                datetimes are exact. start after end wraps over new year
+            months: month number or list of month numbers
+            daytypes: Time.DayType or list of them, i.e. 'SummerDesignDay', ['Saturday', 'Sunday']
+            environment: EnvironmentPeriodIndex or EnvironmentName (or a list of them)
+
+        resample aggregates inside sqlite (GROUP BY on the Time table) instead of returning raw rows:
+            resample: 'D' (day), 'M' (month) or 'hour_of_day'; rows are indexed by (environment, dt or hour).
+                run period and annual values are left out of 'D'/'M', daily and longer ones out of 'hour_of_day'
+            agg: 'sum', 'mean', 'max', 'min', 'count', 'argmax', 'argmin' or a list of them (added as the
+                last column level). ip conversion is applied to the aggregates (sums include the offset per
+                value), argmax/argmin return the interval start of the max/min value'''
+        with call(self.stats, 'getseries', file=self.sqlfile) as total:
+            with stage(self.stats, 'window') as rec:
+                times = self._times(start, end, months, daytypes, environment)
+                rec['rows'] = None if times is None else len(times)
+            with stage(self.stats, 'select') as rec:
+                dfidx = self._select(query)
+                rec['rows'] = len(dfidx)
+            if resample is not None:
+                df = self._aggregate(dfidx, resample, agg, times, units, self._as_selector(query))
+            else:
+                df = self._read_block(dfidx, times, units, dtype, self._as_selector(query), envindex)
+            total['rows'], total['bytes'] = len(df), int(df.memory_usage(index=False).sum())
+        return df
 
+    def iter_series(self, query, chunk_columns=None, chunk_rows=None, units='ip', dtype='float64', **window):
+        '''yields the getseries result in blocks, so large selections can be aggregated or written out
+        with bounded memory. every block has the same index type, column levels and unit conversion as getseries.
+        args:
+            query: same as getseries
+            chunk_columns (optional): max number of series per block
+            chunk_rows (optional): max number of Time rows spanned by a block
+            units: 'ip' or 'si'
+            dtype: 'float64' or 'float32'
+            window (optional): start, end, months, daytypes, environment as in getseries
+        blocks are yielded series group by series group, each group in time order; blocks with no data are skipped.'''
+        dfidx = self._select(query)
+        selector = None if chunk_columns else self._as_selector(query)
+        times = self._times(**window)
+
+        ncols = chunk_columns or max(len(dfidx), 1)
+        groups = [dfidx.iloc[i:i + ncols] for i in range(0, len(dfidx), ncols)]
+
+        if chunk_rows:
+            timeidx = self._maketime().index.values if times is None else times
+            chunks = [timeidx[i:i + chunk_rows] for i in range(0, len(timeidx), chunk_rows)]
+        else:
+            chunks = [times]
+
+        for group in groups:
+            for chunk in chunks:
+                with call(self.stats, 'iter_series', file=self.sqlfile) as total:
+                    df = self._read_block(group, chunk, units, dtype, selector)
+                    total['rows'], total['bytes'] = len(df), int(df.memory_usage(index=False).sum())
+                if len(df):
+                    yield df